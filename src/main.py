@@ -1,21 +1,28 @@
 import os
 from dotenv import load_dotenv
-import openai
 import logging
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI,  Request
 from twilio.rest import Client as TwilioClient
 
 
 
 from .modules.WhatsAppBot import WhatsAppBot
-from .modules.DBClient import DBClient
+from .modules.DBClient import DBClient, AsyncDBClient
 from .modules.WhatsAppHandler import WhatsAppHandler
 from .modules.OpenAIHandler import OpenAIHandler
-from .modules.AudioTranscriber import AudioTranscriber
+from .modules.AudioTranscriber import AudioTranscriber, LocalWhisperBackend
+from .modules.TranscriptionCache import TranscriptionCache
 from .modules.SessionManager import SessionManager
 from .modules.SessionBuilder import SessionBuilder
 from .modules.SessionFactory import SessionFactory
+from .modules.ConfigStore import ConfigStore
+from .modules.ClientPool import ClientPool
+from .modules.LogPipeline import LogPipeline
+from .modules.MemoryWriter import MemoryWriter
+from .modules.MemoryWriteBehind import MemoryWriteBehind
+from .modules.ConversationBuffer import load_encoding
 
 from .modules.ToolManager import ToolManager
 from .modules.Tool.RetrieveMemory import RetrieveMemory
@@ -28,16 +35,23 @@ from .modules.Command.CommandFactory import CommandFactory
 
 
 
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Log records are written by a background thread, the per-message records are sampled and all are rate limited
+log_sample_rate = float(os.getenv('LogSampleRate', '0.1'))
+log_pipeline = LogPipeline(level=logging.INFO,
+                           sample_rates={'message.received': log_sample_rate,
+                                         'tool.call': log_sample_rate,
+                                         'uvicorn.access': log_sample_rate},
+                           rate=float(os.getenv('LogRatePerEvent', '20'))).install()
+
 
 def initialize_commands():
     def reset(bot, user):
-        logging.info(f"Resetting session for user: {user}")
+        logging.info(f"Resetting session for user: {user.phone_number}")
         bot.session_manager.delete_session(user.phone_number)
     
     command_handler = CommandHandler({})
@@ -51,11 +65,16 @@ def initialize_bot():
         os.getenv('DBUser'),
         os.getenv('DBPassword'),
         os.getenv('DBHost'),
-        os.getenv('DBPort', '5432')
+        os.getenv('DBPort', '5432'),
+        min_connections=int(os.getenv('DBMinConnections', '2')),
+        max_connections=int(os.getenv('DBMaxConnections', '10'))
     )
 
 
-    # Get config from DB
+    async_db_client = AsyncDBClient(db_client)
+
+    # Get config from DB, later changes are picked up by the config store in the background
+    config_store = ConfigStore(async_db_client, refresh_interval=float(os.getenv('ConfigRefreshInterval', '60')))
     config = db_client.read_config()
     TWILIO_ACCOUNT_SID = config['TwilioAccountSID']
     TWILIO_AUTH_TOKEN = config['TwilioAuthToken']
@@ -63,32 +82,89 @@ def initialize_bot():
     # Initialize Twilio client
     twilio_client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
 
-    openai.api_base = config['OpenAIBaseURL']
-
-    tool_manager = ToolManager()
+    tool_manager = ToolManager(max_concurrency=int(os.getenv('ToolMaxConcurrency', '8')))
+    # Saved memories are acknowledged at once and written in the background
+    memory_write_behind = MemoryWriteBehind(flush_interval=float(os.getenv('MemoryFlushInterval', '5')))
 
-    tool_manager.register_tool(RetrieveMemory())
-    tool_manager.register_tool(SaveMemory())
-    tool_manager.register_tool(WebSearch())
+    # Near-duplicate memory queries are answered from the session cache, an empty model only matches exact repeats
+    tool_manager.register_tool(RetrieveMemory(embedding_model=os.getenv('MemoryCacheEmbeddingModel', 'text-embedding-3-small') or None,
+                                              write_behind=memory_write_behind))
+    tool_manager.register_tool(SaveMemory(write_behind=memory_write_behind))
+    tool_manager.register_tool(WebSearch(), timeout=15.0)
 
     whatsapp_handler = WhatsAppHandler(twilio_client)
-    openai_handler = OpenAIHandler(tool_manager)
-    audio_transcriber = AudioTranscriber()
-    session_manager = SessionManager()
-    session_factory = SessionFactory(SessionBuilder())
+    openai_handler = OpenAIHandler(tool_manager, use_async=True,
+                                   stream=os.getenv('OpenAIStream', 'false').lower() == 'true')
+    transcription_cache = TranscriptionCache(directory=os.getenv('TranscriptionCacheDir', 'cache/transcriptions'),
+                                             disk_size=int(os.getenv('TranscriptionCacheSize', str(100 * 1024 * 1024))))
+    audio_transcriber = AudioTranscriber(auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN), cache=transcription_cache,
+                                         segment_length=float(os.getenv('TranscriptionSegmentLength', '120')),
+                                         max_parallel_segments=int(os.getenv('TranscriptionParallelSegments', '4')))
+    if os.getenv('LocalWhisperModel'):
+        audio_transcriber.register_backend(LocalWhisperBackend(os.getenv('LocalWhisperModel'),
+                                                               workers=int(os.getenv('LocalWhisperWorkers', '2'))))
+    audio_transcriber.default_backend = os.getenv('TranscriptionBackend', 'openai')
+    session_manager = SessionManager(sweep_interval=float(os.getenv('SessionSweepInterval', '30')))
+    client_pool = ClientPool(max_size=int(os.getenv('ClientPoolSize', '256')))
+    session_factory = SessionFactory(SessionBuilder(), base_url=config.get('OpenAIBaseURL') or None, client_pool=client_pool,
+                                     conversation_turns=int(os.getenv('ConversationTurns', '20')),
+                                     conversation_tokens=int(os.getenv('ConversationTokens', '4000')))
+    memory_writer = MemoryWriter()
+    # Token counts of the conversation buffers are estimated when the encoding is not available
+    load_encoding()
 
     command_handler = initialize_commands()
 
     logger = logging.getLogger(__name__)
 
-    bot = WhatsAppBot(db_client, 
+    def apply_config(config, previous):
+        # In-flight requests keep the client they already hold
+        if (config.get('TwilioAccountSID'), config.get('TwilioAuthToken')) != \
+                (previous.get('TwilioAccountSID'), previous.get('TwilioAuthToken')):
+            whatsapp_handler.client = TwilioClient(config['TwilioAccountSID'], config['TwilioAuthToken'])
+            audio_transcriber.auth = (config['TwilioAccountSID'], config['TwilioAuthToken'])
+        session_factory.base_url = config.get('OpenAIBaseURL') or None
+
+    config_store.load(config)
+    config_store.subscribe(apply_config)
+
+    bot = WhatsAppBot(async_db_client, 
                       whatsapp_handler, 
                       openai_handler, 
                       audio_transcriber, 
                       session_manager, 
                       session_factory, 
                       command_handler,
-                      logger)
+                      logger,
+                      memory_writer)
+    bot.register_service(log_pipeline)
+    # Stops after every service that queries the database
+    bot.register_service(async_db_client)
+    bot.register_service(config_store)
+    bot.register_service(session_manager)
+    # Stops before the session manager, a write in progress ends before the sessions are torn down
+    bot.register_service(memory_writer)
+    # Flushes the saved memories on shutdown
+    bot.register_service(memory_write_behind)
+    bot.register_service(audio_transcriber)
+    bot.register_service(whatsapp_handler)
+
+    # Smooth replies to the Twilio throughput limits
+    if os.getenv('DeliverySenderRate'):
+        bot.enable_delivery_scheduler(sender_rate=float(os.getenv('DeliverySenderRate')),
+                                      account_rate=float(os.getenv('DeliveryAccountRate', '30')),
+                                      dead_letter_path=os.getenv('DeliveryDeadLetterPath'))
+
+    # Fold old turns into a running summary so long chats keep a constant prompt size
+    if os.getenv('SummaryModel'):
+        bot.enable_summarizer(model=os.getenv('SummaryModel'),
+                              summary_interval=int(os.getenv('SummaryInterval', '4')))
+
+    # Acknowledge webhooks right away and run the assistant in the background
+    if os.getenv('MessageQueueWorkers'):
+        bot.enable_message_queue(workers=int(os.getenv('MessageQueueWorkers')),
+                                 max_depth=int(os.getenv('MessageQueueDepth', '1000')),
+                                 debounce_period=float(os.getenv('MessageDebouncePeriod', '0')))
     return bot
 
 
@@ -96,7 +172,13 @@ def initialize_bot():
 if __name__ == '__main__':
     bot = initialize_bot()
 
-    app = FastAPI()
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await bot.start()
+        yield
+        await bot.stop()
+
+    app = FastAPI(lifespan=lifespan)
 
     # add bot heartbeat route to FastAPI
     @app.get("/")
@@ -111,6 +193,7 @@ if __name__ == '__main__':
     host = os.getenv('HOST', '0.0.0.0')
     port = int(os.getenv('PORT', '8080'))
 
-    uvicorn.run(app, host=host, port=port)
+    # Keep uvicorn from installing its own stderr handlers, its records go through the log pipeline
+    uvicorn.run(app, host=host, port=port, log_config=None)
 
 
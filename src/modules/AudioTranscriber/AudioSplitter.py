@@ -0,0 +1,80 @@
+import importlib.util
+import io
+import re
+from typing import List, Optional, Tuple
+
+
+def is_available() -> bool:
+    """
+    Splitting needs the optional pydub package (and ffmpeg) to decode the audio.
+    """
+    return importlib.util.find_spec("pydub") is not None
+
+
+def split_audio(audio: bytes, audio_format: str, segment_length: float, overlap: float,
+                min_silence_length: float = 0.5, silence_threshold: float = -16.0) -> Optional[List[Tuple[bytes, bool]]]:
+    """
+    Split audio into segments of about segment_length seconds, cutting in the middle of silences.
+    Where no silence is found the audio is cut hard and the next segment starts overlap seconds earlier.
+
+    :param audio: The encoded audio.
+    :param audio_format: The format of the audio, e.g. "ogg".
+    :param segment_length: The longest segment in seconds.
+    :param overlap: The seconds repeated at the start of a segment following a hard cut.
+    :param min_silence_length: The shortest pause in seconds treated as a silence.
+    :param silence_threshold: The loudness relative to the average, in dBFS, below which audio is silent.
+    :return: The encoded segments with a flag telling if they overlap the previous one,
+             or None when the audio is short enough to be transcribed whole.
+    """
+    from pydub import AudioSegment
+    from pydub.silence import detect_silence
+
+    sound = AudioSegment.from_file(io.BytesIO(audio), format=audio_format)
+    segment_ms = int(segment_length * 1000)
+    # Do not leave a short tail, it transcribes poorly
+    if len(sound) <= segment_ms * 1.2:
+        return None
+
+    silences = detect_silence(sound, min_silence_len=int(min_silence_length * 1000),
+                              silence_thresh=sound.dBFS + silence_threshold)
+    pauses = [(start + end) // 2 for start, end in silences]
+
+    segments = []
+    start, overlapped = 0, False
+    while start < len(sound):
+        if len(sound) - start <= segment_ms * 1.2:
+            end, hard_cut = len(sound), False
+        else:
+            # The latest pause in the second half of the segment, else a hard cut
+            candidates = [pause for pause in pauses if start + segment_ms // 2 <= pause <= start + segment_ms]
+            end, hard_cut = (max(candidates), False) if candidates else (start + segment_ms, True)
+
+        segment_start = max(0, start - int(overlap * 1000)) if overlapped else start
+        encoded = io.BytesIO()
+        sound[segment_start:end].export(encoded, format="ogg", codec="libopus")
+        segments.append((encoded.getvalue(), overlapped))
+
+        start, overlapped = end, hard_cut
+    return segments
+
+
+def _words(text: str) -> List[str]:
+    return [re.sub(r"[^\w']", "", word).lower() for word in text.split()]
+
+
+def stitch(texts: List[str], overlapped: List[bool], max_overlap_words: int = 8) -> str:
+    """
+    Join the transcripts of consecutive segments, dropping the words an overlapping
+    segment repeats from the end of the previous one.
+    """
+    result = []
+    for text, is_overlapped in zip(texts, overlapped):
+        words = text.split()
+        if is_overlapped and result:
+            tail, head = _words(" ".join(result[-max_overlap_words:])), _words(" ".join(words[:max_overlap_words]))
+            for size in range(min(len(tail), len(head)), 0, -1):
+                if tail[-size:] == head[:size]:
+                    words = words[size:]
+                    break
+        result.extend(words)
+    return " ".join(result)
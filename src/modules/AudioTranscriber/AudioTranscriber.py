@@ -1,44 +1,160 @@
-from openai import OpenAI
+import asyncio
+import io
 import logging
-import requests
+import tempfile
+import httpx
 
 from ..Session import Session
+from ..TranscriptionCache import TranscriptionCache
+from .TranscriptionBackend import TranscriptionBackend
+from .OpenAITranscriptionBackend import OpenAITranscriptionBackend
+from . import AudioSplitter
 
 class AudioTranscriber:
-    def __init__(self, model: str = "whisper-1"):
+    def __init__(self, model: str = "whisper-1", auth: tuple = None, spool_size: int = 10 * 1024 * 1024,
+                 download_timeout: float = 60.0, cache: TranscriptionCache = None,
+                 default_backend: TranscriptionBackend = None, segment_length: float = 120.0,
+                 segment_overlap: float = 1.0, max_parallel_segments: int = 4, min_split_size: int = 200 * 1024):
         """
         Initialize the AudioTranscriber with a default Whisper model.
         
-        :param model: The Whisper model to use for transcription.
+        :param model: The Whisper model of the OpenAI backend.
+        :param auth: The (account SID, auth token) pair used to download Twilio media, if required.
+        :param spool_size: The size in bytes up to which downloaded audio stays in memory before spilling to disk.
+        :param download_timeout: The timeout in seconds of a media download.
+        :param cache: The cache answering repeated transcriptions of the same audio, None disables caching.
+        :param default_backend: The backend transcribing the audio, the OpenAI backend by default.
+        :param segment_length: The longest segment in seconds long audio is split into at silences, None disables splitting.
+        :param segment_overlap: The seconds repeated at the start of a segment following a cut outside a silence.
+        :param max_parallel_segments: The number of segments of one audio transcribed at the same time.
+        :param min_split_size: The size in bytes below which audio is transcribed whole without decoding it.
         """
         self.model = model
+        self.backends = {}
+        self.register_backend(OpenAITranscriptionBackend(model))
+        if default_backend is not None:
+            self.register_backend(default_backend)
+        self.default_backend = str(default_backend or "openai")
+        self.auth = auth
+        self.spool_size = spool_size
+        self.download_timeout = download_timeout
+        self.cache = cache
+        # Splitting needs pydub, without it long audio is transcribed whole
+        self.segment_length = segment_length if AudioSplitter.is_available() else None
+        self.segment_overlap = segment_overlap
+        self.max_parallel_segments = max_parallel_segments
+        self.min_split_size = min_split_size
+        self.http_client = None
         self.logger = logging.getLogger(__name__)
 
-    def transcribe_audio(self, session: Session, file_path: str) -> str:
+    def register_backend(self, backend: TranscriptionBackend):
+        """Register a backend, default_backend selects it by its name."""
+        self.backends[str(backend)] = backend
+
+    @property
+    def default_backend(self) -> str:
+        return self._default_backend
+
+    @default_backend.setter
+    def default_backend(self, name: str):
+        # Fail at startup rather than on every voice note
+        if name not in self.backends:
+            raise ValueError(f"Unknown transcription backend '{name}', registered backends: {', '.join(self.backends)}")
+        self._default_backend = name
+
+    def get_backend(self, session: Session) -> TranscriptionBackend:
         """
-        Transcribe the given audio file to text using OpenAI's Whisper API.
+        Return the backend transcribing the audio of the session.
+        """
+        return self.backends[self.default_backend]
+
+    async def transcribe_media(self, session: Session, url: str, content_type: str = "audio/ogg") -> str:
+        """
+        Download a media item and transcribe it, the audio never touches a shared file.
+
+        :param session: The session whose OpenAI client is used.
+        :param url: The media URL sent by Twilio.
+        :param content_type: The media content type, used to name the upload.
+        :return: Transcribed text from the audio.
+        """
+        try:
+            audio_file = await self.fetch_audio(url)
+        except Exception as e:
+            self.logger.error(f"Error downloading the file: {e}")
+            return "An error occurred while downloading the audio."
+
+        with audio_file:
+            return await self.transcribe_audio(session, audio_file, self._filename(content_type))
+
+    async def transcribe_audio(self, session: Session, audio_file, filename: str = "audio.ogg") -> str:
+        """
+        Transcribe the given audio to text with the backend of the session.
         
-        :param api_key: The OpenAI API key.
-        :param file_path: The path to the audio file.
+        :param session: The session of the user who sent the audio.
+        :param audio_file: A binary file object, or the path to the audio file.
+        :param filename: The file name sent with the upload, its extension tells the API the format.
         :return: Transcribed text from the audio file.
         """
+        opened_file = None
         try:
-            # Initialize the OpenAI client with the provided API key
-            client = session.openai_client
+            backend = self.get_backend(session)
 
             # Load the audio file
-            audio_file = self._load_audio_file(file_path)
+            if isinstance(audio_file, str):
+                audio_file = opened_file = self._load_audio_file(audio_file)
+
+            # Forwarded voice notes and retried webhooks carry the same audio
+            cache_key = None
+            if self.cache is not None:
+                cache_key = await self.cache.key(audio_file, f"{backend}:{backend.model}")
+                cached_text = await self.cache.get(cache_key)
+                if cached_text is not None:
+                    return cached_text
             
-            # Transcribe the audio using the Whisper API
-            transcript = client.audio.transcriptions.create(
-                model=self.model,
-                file=audio_file
-            )
+            text = await self._transcribe_segments(backend, session, audio_file, filename)
+
+            if cache_key is not None:
+                await self.cache.set(cache_key, text)
             
-            return transcript.text
+            return text
         except Exception as e:
             self.logger.error(f"Error during transcription: {e}")
             return "An error occurred during transcription."
+        finally:
+            if opened_file is not None:
+                opened_file.close()
+
+    async def _transcribe_segments(self, backend: TranscriptionBackend, session: Session, audio_file, filename: str) -> str:
+        """
+        Transcribe long audio as segments split at silences, in parallel, and stitch the text back in order.
+        """
+        if self.segment_length is None:
+            return await backend.transcribe(session, audio_file, filename)
+
+        audio = audio_file.read()
+        audio_file.seek(0)
+        if len(audio) < self.min_split_size:
+            return await backend.transcribe(session, audio_file, filename)
+
+        audio_format = filename.rsplit(".", 1)[-1]
+        try:
+            segments = await asyncio.to_thread(AudioSplitter.split_audio, audio, audio_format,
+                                               self.segment_length, self.segment_overlap)
+        except Exception as e:
+            self.logger.warning(f"Error splitting audio, transcribing it whole: {e}")
+            segments = None
+
+        if segments is None:
+            return await backend.transcribe(session, audio_file, filename)
+
+        semaphore = asyncio.Semaphore(self.max_parallel_segments)
+
+        async def transcribe_segment(segment: bytes) -> str:
+            async with semaphore:
+                return await backend.transcribe(session, io.BytesIO(segment), "segment.ogg")
+
+        texts = await asyncio.gather(*[transcribe_segment(segment) for segment, _ in segments])
+        return AudioSplitter.stitch(texts, [overlapped for _, overlapped in segments])
 
     def _load_audio_file(self, file_path: str):
         """
@@ -56,23 +172,46 @@ class AudioTranscriber:
             self.logger.error(f"Error loading audio file: {e}")
             raise
 
-    def download_audio_file(self, url, local_filename):
+    async def fetch_audio(self, url: str):
         """
-        Download the audio file from the provided URL and save it locally.
+        Stream the audio file from the provided URL into a private buffer.
+        The buffer stays in memory up to spool_size bytes and must be closed by the caller.
+
+        :param url: The media URL.
+        :return: A binary file object positioned at the start of the audio.
         """
+        if self.http_client is None:
+            # Twilio media URLs redirect to the storage backend
+            self.http_client = httpx.AsyncClient(timeout=self.download_timeout, follow_redirects=True)
+
+        audio_file = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
         try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()  # Check for request errors
+            async with self.http_client.stream("GET", url, auth=self.auth) as response:
+                response.raise_for_status()  # Check for request errors
+                async for chunk in response.aiter_bytes():
+                    audio_file.write(chunk)
+        except Exception:
+            audio_file.close()
+            raise
 
-            with open(local_filename, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+        audio_file.seek(0)
+        return audio_file
 
-            print(f"Downloaded file saved as {local_filename}")
+    def _filename(self, content_type: str) -> str:
+        # e.g. "audio/ogg; codecs=opus" -> "audio.ogg"
+        extension = content_type.split(";")[0].split("/")[-1].strip() or "ogg"
+        return f"audio.{extension}"
 
-        except Exception as e:
-            print(f"Error downloading the file: {e}")
-            return None
+    async def start(self):
+        pass
 
+    async def stop(self):
+        """
+        Close the download client and the backends.
+        """
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+        for backend in self.backends.values():
+            backend.close()
 
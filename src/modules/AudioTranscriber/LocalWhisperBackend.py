@@ -0,0 +1,57 @@
+import asyncio
+import importlib.util
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+from .TranscriptionBackend import TranscriptionBackend
+from ..Session import Session
+
+# The model loaded by each worker process, kept for the next audio
+_worker_models = {}
+
+
+def _transcribe_in_worker(model: str, device: str, compute_type: str, audio: bytes) -> str:
+    from faster_whisper import WhisperModel
+
+    key = (model, device, compute_type)
+    if key not in _worker_models:
+        _worker_models[key] = WhisperModel(model, device=device, compute_type=compute_type)
+
+    segments, _ = _worker_models[key].transcribe(io.BytesIO(audio))
+    return "".join(segment.text for segment in segments).strip()
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Transcribes on the local CPU with faster-whisper.
+    The model runs in a pool of worker processes, so it holds neither the GIL nor the event loop.
+    Requires the optional faster-whisper package.
+    """
+    def __init__(self, model: str = "small", workers: int = 2, device: str = "cpu", compute_type: str = "int8"):
+        """
+        :param model: The faster-whisper model size or path.
+        :param workers: The number of worker processes, each loads its own copy of the model.
+        :param device: The device the model runs on.
+        :param compute_type: The quantization used by the model.
+        """
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise ImportError("LocalWhisperBackend requires the faster-whisper package")
+
+        self.model = model
+        self.device = device
+        self.compute_type = compute_type
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    async def transcribe(self, session: Session, audio_file, filename: str) -> str:
+        audio = audio_file.read()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _transcribe_in_worker,
+                                          self.model, self.device, self.compute_type, audio)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __str__(self) -> str:
+        return "local"
+
+__all__ = ['LocalWhisperBackend']
@@ -0,0 +1,29 @@
+import inspect
+
+from .TranscriptionBackend import TranscriptionBackend
+from ..Session import Session
+
+
+class OpenAITranscriptionBackend(TranscriptionBackend):
+    """
+    Transcribes with OpenAI's hosted Whisper API, using the session's API key.
+    """
+    def __init__(self, model: str = "whisper-1"):
+        self.model = model
+
+    async def transcribe(self, session: Session, audio_file, filename: str) -> str:
+        # Prefer the async client, the upload then does not block the event loop
+        client = session.async_openai_client or session.openai_client
+
+        transcript = client.audio.transcriptions.create(
+            model=self.model,
+            file=(filename, audio_file)
+        )
+        if inspect.isawaitable(transcript):
+            transcript = await transcript
+        return transcript.text
+
+    def __str__(self) -> str:
+        return "openai"
+
+__all__ = ['OpenAITranscriptionBackend']
@@ -0,0 +1,25 @@
+from ..Session import Session
+
+
+class TranscriptionBackend:
+    """
+    A speech to text engine used by the AudioTranscriber.
+    """
+    model: str
+
+    async def transcribe(self, session: Session, audio_file, filename: str) -> str:
+        """
+        :param session: The session of the user who sent the audio.
+        :param audio_file: A binary file object positioned at the start of the audio.
+        :param filename: The file name of the audio, its extension tells the format.
+        :return: The transcribed text.
+        """
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def close(self):
+        pass
+
+    def __str__(self) -> str:
+        return "backend name"
+
+__all__ = ['TranscriptionBackend']
@@ -0,0 +1,40 @@
+import statistics
+import time
+from typing import Dict, List
+
+from .TranscriptionBackend import TranscriptionBackend
+from ..Session import Session
+
+
+async def benchmark(backends: List[TranscriptionBackend], session: Session, files: List[str],
+                    repeats: int = 3) -> Dict[str, dict]:
+    """
+    Transcribe every file with every backend and measure the latency.
+    All backends get the same audio, so their numbers compare directly.
+
+    :param backends: The backends to compare.
+    :param session: The session whose clients the hosted backends use.
+    :param files: The paths of the audio files.
+    :param repeats: The number of transcriptions of every file per backend.
+    :return: Per backend name, the median, mean and worst latency in seconds and the last transcripts.
+    """
+    results = {}
+    for backend in backends:
+        latencies = []
+        transcripts = {}
+        for path in files:
+            for _ in range(repeats):
+                with open(path, "rb") as audio_file:
+                    start = time.perf_counter()
+                    transcripts[path] = await backend.transcribe(session, audio_file, path.split("/")[-1])
+                    latencies.append(time.perf_counter() - start)
+
+        results[f"{backend}:{backend.model}"] = {
+            "median": statistics.median(latencies),
+            "mean": statistics.mean(latencies),
+            "max": max(latencies),
+            "transcripts": transcripts,
+        }
+    return results
+
+__all__ = ['benchmark']
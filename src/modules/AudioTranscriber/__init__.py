@@ -1 +1,4 @@
-from .AudioTranscriber import AudioTranscriber
\ No newline at end of file
+from .AudioTranscriber import AudioTranscriber
+from .TranscriptionBackend import TranscriptionBackend
+from .OpenAITranscriptionBackend import OpenAITranscriptionBackend
+from .LocalWhisperBackend import LocalWhisperBackend
\ No newline at end of file
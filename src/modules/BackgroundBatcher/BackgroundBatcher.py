@@ -0,0 +1,88 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundBatcher:
+    """
+    Base of the services processing queued work in batches on a background task.
+    A batch is processed every flush_interval, or as soon as batch_size items are queued.
+    Subclasses implement flush, which processes one batch and queues failed items again
+    until they used up max_attempts, and queued, the number of queued items.
+    """
+    def __init__(self, batch_size: int, flush_interval: float, max_attempts: int):
+        """
+        :param batch_size: The number of queued items that triggers a flush.
+        :param flush_interval: The longest an item waits before it is processed.
+        :param max_attempts: The number of attempts of an item before it is given up.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.wakeup = None
+        self.task = None
+        self.stopping = False
+
+    async def flush(self):
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def queued(self) -> int:
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def notify(self):
+        """
+        Flush right away once a full batch is queued, call it after queueing items.
+        """
+        if self.wakeup is not None and self.queued() >= self.batch_size:
+            self.wakeup.set()
+
+    def should_retry(self, attempts: int, description: str, error) -> bool:
+        """
+        Whether an item that failed its attempts-th attempt is queued again, logs the items given up.
+        """
+        if attempts < self.max_attempts:
+            return True
+        logger.error(f"Giving up {description} after {attempts} attempts: {error}")
+        return False
+
+    async def start(self):
+        if self.task is None:
+            self.stopping = False
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and process every queued item.
+        """
+        if self.task is not None:
+            # Not cancelled, a batch cut off halfway could be lost
+            self.stopping = True
+            self.wakeup.set()
+            await self.task
+            self.task = None
+
+        # Every flush uses up an attempt of the failed items, so this ends
+        while self.queued():
+            await self.flush()
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+            try:
+                while self.queued():
+                    await self.flush()
+                    # Retried items wait for the next interval
+                    if self.queued() < self.batch_size:
+                        break
+            except Exception as e:
+                logger.error(f"Error flushing {type(self).__name__}: {e}")
+
+
+__all__ = ['BackgroundBatcher']
@@ -0,0 +1 @@
+from .BackgroundBatcher import BackgroundBatcher
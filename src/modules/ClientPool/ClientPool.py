@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import inspect
+import logging
+import threading
+from collections import OrderedDict
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from mem0 import MemoryClient
+
+logger = logging.getLogger(__name__)
+
+class ClientPool:
+    """
+    Process wide registry of API clients keyed by a fingerprint of their API key.
+    Sessions sharing a key, and later sessions of the same user, reuse the warm connections of one client.
+    Every client handed out is held until it is released, an evicted client is closed once its last holder releases it.
+    """
+    def __init__(self, max_size: int = 256, max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 60.0):
+        """
+        :param max_size: The number of clients kept, the least recently used client is evicted first.
+        :param max_connections: The connection limit of every OpenAI client.
+        :param max_keepalive_connections: The idle connections every OpenAI client keeps open.
+        :param keepalive_expiry: The seconds an idle connection is kept open.
+        """
+        self.max_size = max_size
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.clients = OrderedDict()
+        self.lock = threading.Lock()
+        # id of a client -> the number of holders that did not release it yet
+        self.holders = {}
+        # id of an evicted client -> the client, closed on its last release
+        self.evicted = {}
+        self.closing = set()
+
+    @staticmethod
+    def fingerprint(api_key: str) -> str:
+        """
+        Identify an API key without keeping it in the registry keys.
+        """
+        return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    def get_openai_client(self, api_key: str, base_url: str = None) -> OpenAI:
+        return self._get(("openai", self.fingerprint(api_key), base_url),
+                         lambda: OpenAI(api_key=api_key, base_url=base_url,
+                                        http_client=DefaultHttpxClient(limits=self.limits)))
+
+    def get_async_openai_client(self, api_key: str, base_url: str = None) -> AsyncOpenAI:
+        return self._get(("async_openai", self.fingerprint(api_key), base_url),
+                         lambda: AsyncOpenAI(api_key=api_key, base_url=base_url,
+                                             http_client=DefaultAsyncHttpxClient(limits=self.limits)))
+
+    def get_memory_client(self, api_key: str) -> MemoryClient:
+        return self._get(("mem0", self.fingerprint(api_key)), lambda: MemoryClient(api_key))
+
+    def release(self, *clients):
+        """
+        Release clients taken from the pool, evicted clients are closed once nobody holds them.
+        """
+        closed = []
+        with self.lock:
+            for client in clients:
+                if client is None or id(client) not in self.holders:
+                    continue
+                self.holders[id(client)] -= 1
+                if self.holders[id(client)] == 0:
+                    del self.holders[id(client)]
+                    if id(client) in self.evicted:
+                        closed.append(self.evicted.pop(id(client)))
+
+        for client in closed:
+            self._schedule_close(client)
+
+    def _get(self, key, create):
+        with self.lock:
+            client = self.clients.get(key)
+            if client is not None:
+                self.clients.move_to_end(key)
+                self.holders[id(client)] = self.holders.get(id(client), 0) + 1
+                return client
+
+        # Created outside the lock, client constructors may do network I/O
+        client = create()
+
+        with self.lock:
+            # Another caller may have created the client meanwhile, keep the first one
+            created, client = client, self.clients.setdefault(key, client)
+            self.clients.move_to_end(key)
+            self.holders[id(client)] = self.holders.get(id(client), 0) + 1
+            closed = []
+            while len(self.clients) > self.max_size:
+                _, stale = self.clients.popitem(last=False)
+                # A client still held by a session is closed on its last release
+                if id(stale) in self.holders:
+                    self.evicted[id(stale)] = stale
+                else:
+                    closed.append(stale)
+
+        # The duplicate was never handed out
+        if created is not client:
+            closed.append(created)
+        for stale in closed:
+            self._schedule_close(stale)
+        return client
+
+    def _schedule_close(self, client):
+        """
+        Close a client nobody holds.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop is None:
+            # Nothing awaits outside an event loop, sync clients are closed right away
+            if not inspect.iscoroutinefunction(getattr(client, "close", None)):
+                self._close_sync(client)
+            return
+
+        task = loop.create_task(self._close(client))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    async def _close(self, client):
+        try:
+            result = client.close() if hasattr(client, "close") else None
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"Error closing evicted client: {e}")
+
+    def _close_sync(self, client):
+        try:
+            if hasattr(client, "close"):
+                client.close()
+        except Exception as e:
+            logger.warning(f"Error closing evicted client: {e}")
+
+    def __len__(self):
+        return len(self.clients)
+
+
+__all__ = ['ClientPool']
@@ -0,0 +1 @@
+from .ClientPool import ClientPool
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from typing import Callable, Dict
+
+from ..DBClient import AsyncDBClient
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigStore:
+    """
+    Cached copy of the config table, refreshed in the background.
+
+    Every refresh that changes the config replaces the whole dict and bumps the version,
+    readers holding the previous dict keep a consistent snapshot.
+    """
+    def __init__(self, db_client: AsyncDBClient, refresh_interval: float = 60.0):
+        """
+        :param db_client: The client used to read the config table.
+        :param refresh_interval: The seconds between two reads of the config table.
+        """
+        self.db_client = db_client
+        self.refresh_interval = refresh_interval
+        self.config = {}
+        self.version = 0
+        self.listeners = []
+        self.task = None
+
+    def subscribe(self, listener: Callable[[Dict[str, str], Dict[str, str]], None]):
+        """
+        Register a listener called with the new and the previous config on every change.
+        """
+        self.listeners.append(listener)
+
+    def get(self, key: str, default=None):
+        return self.config.get(key, default)
+
+    def load(self, config: Dict[str, str]) -> bool:
+        """
+        Swap in a freshly read config.
+
+        :return: True if the config changed, False otherwise.
+        """
+        if not config or config == self.config:
+            return False
+
+        previous = self.config
+        self.config = dict(config)
+        self.version += 1
+        logger.info(f"Loaded config version {self.version}")
+
+        for listener in self.listeners:
+            try:
+                listener(self.config, previous)
+            except Exception as e:
+                logger.error(f"Error applying config version {self.version}: {e}")
+        return True
+
+    async def refresh(self) -> bool:
+        """
+        Read the config table and swap it in if it changed.
+        An empty result (the database is unreachable) keeps the current config.
+        """
+        config = await self.db_client.read_config()
+        if not config:
+            logger.warning("Config refresh returned nothing, keeping the current config")
+            return False
+        return self.load(config)
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing config: {e}")
+
+
+__all__ = ['ConfigStore']
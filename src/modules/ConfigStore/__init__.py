@@ -0,0 +1 @@
+from .ConfigStore import ConfigStore
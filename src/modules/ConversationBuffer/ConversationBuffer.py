@@ -0,0 +1,117 @@
+import importlib.util
+import logging
+from collections import deque
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+
+
+def load_encoding(name: str = "o200k_base") -> bool:
+    """
+    Load the tokenizer of the optional tiktoken package, call it once at startup.
+    The first load may download the encoding, so it never happens while counting.
+
+    :return: True when tokens are counted exactly, False when they are estimated.
+    """
+    global _encoding
+    if _encoding is None and importlib.util.find_spec("tiktoken") is not None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.warning(f"Could not load the {name} encoding, estimating token counts: {e}")
+    return _encoding is not None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text with the encoding loaded by load_encoding,
+    or estimate them at about four characters per token.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class Turn:
+    """
+    One user message and the assistant answer to it.
+    """
+    def __init__(self, index: int, user: str, assistant: str, tokens: int, messages: int = 2):
+        self.index = index
+        self.user = user
+        self.assistant = assistant
+        self.tokens = tokens
+        # The number of thread messages of the turn
+        self.messages = messages
+
+    def __str__(self) -> str:
+        return f"User: {self.user}\nAssistant: {self.assistant}"
+
+
+class ConversationBuffer:
+    """
+    The recent turns of a session, kept in process.
+    The oldest turns are evicted once the buffer holds more than max_turns turns or max_tokens tokens.
+    When the session is summarized, evicted turns wait in unsummarized until they are folded into the running summary.
+    """
+    def __init__(self, max_turns: int = 20, max_tokens: int = 4000):
+        """
+        :param max_turns: The number of turns kept.
+        :param max_tokens: The token budget of the kept turns, the latest turn is always kept.
+        """
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.turns = deque()
+        self.tokens = 0
+        # The number of turns appended over the lifetime of the session
+        self.count = 0
+        # The summary of the turns evicted and folded so far
+        self.summary = ""
+        self.unsummarized = deque()
+
+    def append(self, user: str, assistant: str, messages: int = 2) -> List[Turn]:
+        """
+        Add a turn to the buffer.
+
+        :param messages: The number of thread messages of the turn.
+        :return: The turns evicted to make room for it, oldest first.
+        """
+        turn = Turn(self.count, user, assistant, count_tokens(user) + count_tokens(assistant), messages)
+        self.count += 1
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+
+        evicted = []
+        while len(self.turns) > 1 and (len(self.turns) > self.max_turns or self.tokens > self.max_tokens):
+            evicted.append(self._pop())
+        return evicted
+
+    def fold(self, summary: str, turns: int):
+        """
+        Replace the summary with one that also covers the oldest turns of unsummarized.
+
+        :param turns: The number of unsummarized turns the new summary covers.
+        """
+        self.summary = summary
+        for _ in range(turns):
+            self.unsummarized.popleft()
+
+    def context_messages(self) -> int:
+        """
+        The number of trailing thread messages not covered by the summary.
+        """
+        return sum(turn.messages for turn in self.unsummarized) + sum(turn.messages for turn in self.turns)
+
+    def _pop(self) -> Turn:
+        turn = self.turns.popleft()
+        self.tokens -= turn.tokens
+        return turn
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+
+__all__ = ['ConversationBuffer', 'Turn', 'count_tokens']
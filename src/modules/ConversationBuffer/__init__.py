@@ -0,0 +1 @@
+from .ConversationBuffer import ConversationBuffer, Turn, count_tokens, load_encoding
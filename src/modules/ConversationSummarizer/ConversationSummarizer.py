@@ -0,0 +1,96 @@
+import asyncio
+import inspect
+import logging
+from typing import List
+
+from ..Session import Session
+from ..ConversationBuffer import Turn
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationSummarizer:
+    """
+    Keeps the assistant runs of long sessions at an almost constant prompt size.
+    The turns evicted from the conversation buffer are folded into a running summary in the background,
+    runs only see the summary and the thread messages it does not cover.
+    """
+    def __init__(self, model: str = "gpt-4o-mini", summary_interval: int = 4, max_summary_tokens: int = 500):
+        """
+        :param model: The chat model writing the summaries.
+        :param summary_interval: The number of evicted turns folded at once, the summary is updated
+        at most once per summary_interval turns.
+        :param max_summary_tokens: The longest summary.
+        """
+        self.model = model
+        self.summary_interval = summary_interval
+        self.max_summary_tokens = max_summary_tokens
+        # The running fold of each session, at most one per session
+        self.tasks = {}
+
+    def add(self, session: Session, evicted: List[Turn]):
+        """
+        Queue the turns evicted from the session buffer and start a fold once enough turns are waiting.
+        """
+        conversation = session.conversation
+        conversation.unsummarized.extend(evicted)
+
+        if len(conversation.unsummarized) >= self.summary_interval and session.session_id not in self.tasks:
+            task = asyncio.create_task(self._fold(session))
+            self.tasks[session.session_id] = task
+            task.add_done_callback(lambda _: self.tasks.pop(session.session_id, None))
+
+    def run_options(self, session: Session) -> dict:
+        """
+        The run parameters limiting the thread context to the messages the summary does not cover.
+        """
+        conversation = session.conversation
+        if not conversation.summary:
+            return {}
+
+        return {
+            "additional_instructions": f"Summary of the earlier conversation:\n{conversation.summary}",
+            # The messages not counted by a turn yet, and the new user message added before the run
+            "truncation_strategy": {"type": "last_messages",
+                                    "last_messages": conversation.context_messages() + session.thread_messages + 1},
+        }
+
+    async def _fold(self, session: Session):
+        conversation = session.conversation
+        turns = list(conversation.unsummarized)
+        transcript = "\n\n".join(str(turn) for turn in turns)
+
+        messages = [
+            {"role": "system", "content": "You maintain the running summary of a chat between a user and an assistant. "
+                                          "Merge the new part of the conversation into the summary. Keep facts, decisions, "
+                                          "open questions and user preferences, drop small talk. Answer with the summary only."},
+            {"role": "user", "content": f"Summary so far:\n{conversation.summary or '(none)'}\n\nNew conversation:\n{transcript}"},
+        ]
+
+        try:
+            # Prefer the async client, the request then does not block the event loop
+            client = session.async_openai_client or session.openai_client
+            response = client.chat.completions.create(model=self.model, messages=messages,
+                                                      max_tokens=self.max_summary_tokens)
+            if inspect.isawaitable(response):
+                response = await response
+
+            conversation.fold(response.choices[0].message.content.strip(), len(turns))
+        except Exception as e:
+            # The turns stay unsummarized and are folded with the next ones
+            logger.error(f"Error summarizing session {session.session_id}: {e}")
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        """
+        Cancel the running folds, the summaries do not outlive the process.
+        """
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+__all__ = ['ConversationSummarizer']
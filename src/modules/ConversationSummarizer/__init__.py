@@ -0,0 +1 @@
+from .ConversationSummarizer import ConversationSummarizer
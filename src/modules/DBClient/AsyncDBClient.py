@@ -0,0 +1,70 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Dict, List
+
+from .DBClient import DBClient
+from ..User.User import User
+from ..TTLCache import TTLCache
+
+class AsyncDBClient:
+    """
+    Awaitable counterpart of DBClient with the same methods.
+    Queries run on a thread pool sized to the connection pool, so the event loop never waits on PostgreSQL.
+    """
+    def __init__(self, db_client: DBClient):
+        self.db_client = db_client
+        self.executor = ThreadPoolExecutor(max_workers=db_client.max_connections, thread_name_prefix="db")
+
+    async def start(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.db_client.max_connections, thread_name_prefix="db")
+
+    async def stop(self):
+        """
+        Wait for running queries and close the pooled connections.
+        """
+        if self.executor is not None:
+            executor, self.executor = self.executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True)
+        self.db_client.close()
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+    async def check_user_exists(self, phone_number: str) -> bool:
+        return await self._run(self.db_client.check_user_exists, phone_number)
+
+    async def get_user(self, phone_number: str) -> Optional[User]:
+        # Cache hits are answered without a trip to the thread pool
+        cached = self.db_client.get_cached_user(phone_number)
+        if cached is not TTLCache.MISSING:
+            return cached
+        return await self._run(self.db_client.get_user, phone_number)
+
+    async def add_user(self, user: User) -> bool:
+        return await self._run(self.db_client.add_user, user)
+
+    async def update_user(self, user: User) -> bool:
+        return await self._run(self.db_client.update_user, user)
+
+    async def remove_user(self, user: User) -> bool:
+        return await self._run(self.db_client.remove_user, user)
+
+    async def get_all_users(self) -> List[User]:
+        return await self._run(self.db_client.get_all_users)
+
+    async def read_config(self) -> Dict[str, str]:
+        return await self._run(self.db_client.read_config)
+
+    async def add_api_key(self, user: User, api_key_name: str, api_key_value: str) -> bool:
+        return await self._run(self.db_client.add_api_key, user, api_key_name, api_key_value)
+
+    async def add_api_key_to_all_users(self, api_key_name: str, api_key_value: str, batch_size: Optional[int] = 10000,
+                                       progress_callback: Optional[Callable[[int], None]] = None) -> bool:
+        return await self._run(self.db_client.add_api_key_to_all_users, api_key_name, api_key_value,
+                               batch_size=batch_size, progress_callback=progress_callback)
+
+
+__all__ = ['AsyncDBClient']
@@ -1,11 +1,26 @@
 import psycopg2
-from typing import Optional, Dict, List
+from psycopg2 import pool
+import copy
+import threading
+import time
+from typing import Callable, Optional, Dict, List
 import json
 
 from ..User.User import User
+from ..TTLCache import TTLCache
 
 class DBClient:
-    def __init__(self, dbname: str, user: str, password: str, host: str = 'localhost', port='5432'):
+    def __init__(self, dbname: str, user: str, password: str, host: str = 'localhost', port='5432',
+                 min_connections: int = 2, max_connections: int = 10, health_check_interval: float = 30.0,
+                 user_cache_size: int = 10000, user_cache_ttl: float = 300.0, missing_user_cache_ttl: float = 30.0):
+        """
+        :param min_connections: The number of idle connections kept open in the pool.
+        :param max_connections: The maximum number of connections in use at the same time.
+        :param health_check_interval: Connections idle for longer than this many seconds are checked before use.
+        :param user_cache_size: The number of users (found or missing) kept by get_user.
+        :param user_cache_ttl: The seconds a found user is served from the cache.
+        :param missing_user_cache_ttl: The seconds an unknown phone number is served from the cache.
+        """
         self.connection_params = {
             'dbname': dbname,
             'user': user,
@@ -14,61 +29,148 @@ class DBClient:
             'connect_timeout': 60,
             'port': port
         }
-        self.conn = None
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        # Bounds the checked out connections, the pool raises instead of waiting when exhausted
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.last_used = {}
+        self.user_cache = TTLCache(max_size=user_cache_size, ttl=user_cache_ttl)
+        self.missing_user_cache_ttl = missing_user_cache_ttl
+
+    def _get_pool(self):
+        with self.pool_lock:
+            if self.pool is None or self.pool.closed:
+                self.pool = pool.ThreadedConnectionPool(self.min_connections, self.max_connections, **self.connection_params)
+            return self.pool
 
     def _connect(self):
+        """
+        Check out a healthy connection from the pool.
+
+        :return: A connection, or None if the database cannot be reached.
+        """
+        self.slots.acquire()
         try:
-            if self.conn is None or self.conn.closed:
-                self.conn = psycopg2.connect(**self.connection_params)
-        except psycopg2.OperationalError as e:
+            conn_pool = self._get_pool()
+            conn = conn_pool.getconn()
+
+            # Replace connections the server closed while they were idle
+            if not self._is_healthy(conn):
+                conn_pool.putconn(conn, close=True)
+                conn = conn_pool.getconn()
+            return conn
+        except (psycopg2.OperationalError, pool.PoolError) as e:
             print(f"Error connecting to the database: {e}")
-            self.conn = None
+            self.slots.release()
+            return None
 
-    def _disconnect(self):
-        if self.conn is not None and not self.conn.closed:
-            self.conn.close()
+    def _disconnect(self, conn):
+        """
+        Return the connection to the pool, broken connections are discarded by the pool.
+        """
+        if conn is None:
+            return
+        try:
+            self.last_used[id(conn)] = time.monotonic()
+            conn_pool = self.pool
+            if conn_pool is None:
+                # The pool was closed while the connection was checked out
+                conn.close()
+            else:
+                conn_pool.putconn(conn, close=bool(conn.closed))
+        except (psycopg2.Error, pool.PoolError) as e:
+            print(f"Error returning connection to the pool: {e}")
+        finally:
+            self.slots.release()
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - self.last_used.get(id(conn), 0) < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        with self.pool_lock:
+            if self.pool is not None and not self.pool.closed:
+                self.pool.closeall()
+            self.pool = None
 
     def check_user_exists(self, phone_number: str) -> bool:
-        self._connect()
-        if self.conn is None:
+        conn = self._connect()
+        if conn is None:
             return False
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 cur.execute("SELECT 1 FROM users WHERE phone_number = %s", (phone_number,))
                 return cur.fetchone() is not None
         except Exception as e:
             print(f"Error checking user existence: {e}")
             return False
         finally:
-            self._disconnect()
+            self._disconnect(conn)
 
     def get_user(self, phone_number: str) -> Optional[User]:
         """
         Retrieve the user's information based on the phone number.
+        Found and unknown phone numbers are cached, so hot users cost no query.
         
         :param phone_number: The phone number to search for.
         :return: An instance of the User class or None if not found.
         """
-        self._connect()
-        if self.conn is None:
+        cached = self.get_cached_user(phone_number)
+        if cached is not TTLCache.MISSING:
+            return cached
+
+        # A write committed while the row is read invalidates it, the stale row is then not cached
+        generation = self.user_cache.generation(phone_number)
+        conn = self._connect()
+        if conn is None:
             return None
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 cur.execute("SELECT phone_number, assistant_id, api_keys, email FROM users WHERE phone_number = %s", (phone_number,))
                 result = cur.fetchone()
                 if result:
-                    return User(
+                    user = User(
                         phone_number=result[0],
                         assistant_id=result[1],
                         api_keys=result[2],
                         email=result[3]
                     )
+                    self.user_cache.set(phone_number, copy.deepcopy(user), generation=generation)
+                    return user
+                self.user_cache.set(phone_number, None, ttl=self.missing_user_cache_ttl, generation=generation)
                 return None
         except Exception as e:
             print(f"Error getting user: {e}")
             return None
         finally:
-            self._disconnect()
+            self._disconnect(conn)
+
+    def get_cached_user(self, phone_number: str):
+        """
+        Look the phone number up in the user cache only.
+
+        :return: A copy of the cached User, None for a known missing user, or TTLCache.MISSING.
+        """
+        cached = self.user_cache.get(phone_number)
+        if cached is TTLCache.MISSING or cached is None:
+            return cached
+        # Callers may modify the user, never hand out the cached instance
+        return copy.deepcopy(cached)
 
     def add_user(self, user: User) -> bool:
         """
@@ -77,20 +179,21 @@ class DBClient:
         :param user: An instance of the User class containing the user's information.
         :return: True if the user was added successfully, False otherwise.
         """
-        self._connect()
-        if self.conn is None:
+        conn = self._connect()
+        if conn is None:
             return False
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 cur.execute("INSERT INTO users (phone_number, assistant_id, api_keys, email) VALUES (%s, %s, %s, %s)", 
                             (user.phone_number, user.assistant_id, user.api_keys, user.email))
-                self.conn.commit()
+                conn.commit()
+                self.user_cache.delete(user.phone_number)
                 return True
         except Exception as e:
             print(f"Error adding user: {e}")
             return False
         finally:
-            self._disconnect()
+            self._disconnect(conn)
 
     def update_user(self, user: User) -> bool:
         """
@@ -99,20 +202,21 @@ class DBClient:
         :param user: An instance of the User class containing the updated user's information.
         :return: True if the user was updated successfully, False otherwise.
         """
-        self._connect()
-        if self.conn is None:
+        conn = self._connect()
+        if conn is None:
             return False
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 cur.execute("UPDATE users SET assistant_id = %s, api_keys = %s, email = %s WHERE phone_number = %s", 
                             (user.assistant_id, json.dumps(user.api_keys), user.email, user.phone_number))
-                self.conn.commit()
+                conn.commit()
+                self.user_cache.delete(user.phone_number)
                 return True
         except Exception as e:
             print(f"Error updating user: {e}")
             return False
         finally:
-            self._disconnect()
+            self._disconnect(conn)
 
     def remove_user(self, user: User) -> bool:
         """
@@ -121,30 +225,31 @@ class DBClient:
         :param user: An instance of the User class.
         :return: True if the user was removed successfully, False otherwise.
         """
-        self._connect()
-        if self.conn is None:
+        conn = self._connect()
+        if conn is None:
             return False
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 cur.execute("DELETE FROM users WHERE phone_number = %s", (user.phone_number,))
-                self.conn.commit()
+                conn.commit()
+                self.user_cache.delete(user.phone_number)
                 return True
         except Exception as e:
             print(f"Error removing user: {e}")
             return False
         finally:
-            self._disconnect()
+            self._disconnect(conn)
 
     def get_all_users(self) -> List[User]:
         """
         Retrieve all users from the database.
         :return: A list of User instances.
         """
-        self._connect()
-        if self.conn is None:
+        conn = self._connect()
+        if conn is None:
             return []
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 cur.execute("SELECT phone_number, assistant_id, api_keys, email FROM users")
                 users = [
                     User(
@@ -160,14 +265,14 @@ class DBClient:
             print(f"Error getting all users: {e}")
             return []
         finally:
-            self._disconnect()
+            self._disconnect(conn)
 
     def read_config(self) -> Dict[str, str]:
-        self._connect()
-        if self.conn is None:
+        conn = self._connect()
+        if conn is None:
             return {}
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 cur.execute("SELECT key, value FROM config")
                 config = {row[0]: row[1] for row in cur.fetchall()}
                 return config
@@ -175,7 +280,7 @@ class DBClient:
             print(f"Error reading config: {e}")
             return {}
         finally:
-            self._disconnect()
+            self._disconnect(conn)
 
     def add_api_key(self, user: User, api_key_name: str, api_key_value: str) -> bool:
         """
@@ -186,11 +291,11 @@ class DBClient:
         :param api_key_value: The value of the API key.
         :return: True if the API key was added/updated successfully, False otherwise.
         """
-        self._connect()
-        if self.conn is None:
+        conn = self._connect()
+        if conn is None:
             return False
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 # Get the current api_keys value
                 cur.execute("SELECT api_keys FROM users WHERE phone_number = %s", (user.phone_number,))
                 current_api_keys = cur.fetchone()[0]
@@ -208,7 +313,8 @@ class DBClient:
                     "UPDATE users SET api_keys = %s WHERE phone_number = %s",
                     (json.dumps(current_api_keys), user.phone_number)
                 )
-                self.conn.commit()
+                conn.commit()
+                self.user_cache.delete(user.phone_number)
 
                 # Update the user object in memory
                 user.api_keys = current_api_keys
@@ -218,53 +324,79 @@ class DBClient:
             print(f"Error adding/updating API key: {e}")
             return False
         finally:
-            self._disconnect()
+            self._disconnect(conn)
 
-    def add_api_key_to_all_users(self, api_key_name: str, api_key_value: str) -> bool:
+    def add_api_key_to_all_users(self, api_key_name: str, api_key_value: str, batch_size: Optional[int] = 10000,
+                                 progress_callback: Optional[Callable[[int], None]] = None) -> bool:
         """
         Add or update an API key in the api_keys JSON object for all users.
+        The keys are merged server side, batch after batch in phone number order, each batch in its own
+        transaction so row locks are held only briefly.
 
         :param api_key_name: The name of the API key (e.g., "openai_api_key").
         :param api_key_value: The value of the API key.
+        :param batch_size: The number of users updated per transaction, None updates all users in one statement.
+        :param progress_callback: Called with the number of users updated so far after every batch.
         :return: True if the API key was added/updated successfully for all users, False otherwise.
         """
-        self._connect()
-        if self.conn is None:
+        conn = self._connect()
+        if conn is None:
             return False
         try:
-            with self.conn.cursor() as cur:
-                # Fetch all users
-                cur.execute("SELECT phone_number, api_keys FROM users")
-                users = cur.fetchall()
-
-                # Iterate through all users and update their api_keys
-                for user in users:
-                    phone_number = user[0]
-                    current_api_keys = user[1]
-
-                    # Update or add the new API key
-                    if current_api_keys is None:
-                        current_api_keys = {}
-                    else:
-                        current_api_keys = dict(current_api_keys)
-
-                    current_api_keys[api_key_name] = api_key_value
+            with conn.cursor() as cur:
+                if batch_size is None:
+                    cur.execute(
+                        "UPDATE users SET api_keys = COALESCE(api_keys::jsonb, '{}'::jsonb) || jsonb_build_object(%s::text, %s::text)",
+                        (api_key_name, api_key_value)
+                    )
+                    conn.commit()
+                    if progress_callback:
+                        progress_callback(cur.rowcount)
+                    return True
 
-                    # Update the database with the new api_keys
+                updated = 0
+                last_phone_number = None
+                while True:
+                    # Keyset pagination, every batch starts after the last updated phone number.
+                    # The cursor is the max in the database collation, the one ORDER BY and > use
                     cur.execute(
-                        "UPDATE users SET api_keys = %s WHERE phone_number = %s",
-                        (json.dumps(current_api_keys), phone_number)
+                        """
+                        WITH batch AS (
+                            SELECT phone_number FROM users
+                            WHERE %s::text IS NULL OR phone_number > %s::text
+                            ORDER BY phone_number
+                            LIMIT %s
+                        ), updated AS (
+                            UPDATE users SET api_keys = COALESCE(users.api_keys::jsonb, '{}'::jsonb) || jsonb_build_object(%s::text, %s::text)
+                            FROM batch
+                            WHERE users.phone_number = batch.phone_number
+                            RETURNING users.phone_number
+                        )
+                        SELECT count(*), max(phone_number) FROM updated
+                        """,
+                        (last_phone_number, last_phone_number, batch_size, api_key_name, api_key_value)
                     )
+                    count, last_phone_number = cur.fetchone()
+                    conn.commit()
+
+                    if not count:
+                        break
+
+                    updated += count
+                    if progress_callback:
+                        progress_callback(updated)
 
-                # Commit all changes at once
-                self.conn.commit()
+                    if count < batch_size:
+                        break
 
                 return True
         except Exception as e:
             print(f"Error adding/updating API key for all users: {e}")
             return False
         finally:
-            self._disconnect()
+            # Batches committed before a failure are visible as well
+            self.user_cache.clear()
+            self._disconnect(conn)
 
 
 
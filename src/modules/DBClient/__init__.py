@@ -1 +1,2 @@
-from .DBClient import DBClient
\ No newline at end of file
+from .DBClient import DBClient
+from .AsyncDBClient import AsyncDBClient
\ No newline at end of file
@@ -0,0 +1,222 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import time
+from collections import deque
+
+from ..WhatsAppHandler import WhatsAppHandler
+
+logger = logging.getLogger(__name__)
+
+# Delivery priorities, lower is sent first
+INTERACTIVE = 0
+BULK = 10
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: The tokens added per second.
+        :param capacity: The most tokens the bucket holds, the largest burst it allows.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, tokens: float) -> float:
+        """
+        Return the seconds until the bucket holds the tokens, 0 if it holds them now.
+        """
+        self._refill()
+        # A request larger than the bucket waits for a full bucket
+        tokens = min(tokens, self.capacity)
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def take(self, tokens: float):
+        self._refill()
+        self.tokens -= min(tokens, self.capacity)
+
+
+class Delivery:
+    def __init__(self, to: str, from_: str, chunks: list, priority: int):
+        self.to = to
+        self.from_ = from_
+        self.chunks = chunks
+        self.priority = priority
+        self.sent = 0
+        self.error = None
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class DeliveryScheduler:
+    """
+    Smooths outbound messages to the Twilio throughput limits.
+    Every sender number has its own priority queue, dispatched as soon as the token buckets of the sender
+    and of the account allow, so a throttled sender never holds up the others. Interactive replies
+    are sent before bulk and proactive messages of the same sender. Replies to one recipient are
+    delivered in the order they were dispatched, replies that keep failing go to a dead-letter store.
+    """
+    def __init__(self, whatsapp_handler: WhatsAppHandler, sender_rate: float = 1.0, sender_burst: int = 10,
+                 account_rate: float = 30.0, account_burst: int = 60, dead_letter_size: int = 1000,
+                 dead_letter_path: str = None, drain_timeout: float = 30.0):
+        """
+        :param whatsapp_handler: The handler sending the messages, it retries failed messages itself.
+        :param sender_rate: The messages per second allowed from one sender number.
+        :param sender_burst: The messages one sender number may send at once.
+        :param account_rate: The messages per second allowed for the whole account.
+        :param account_burst: The messages the account may send at once.
+        :param dead_letter_size: The number of dead letters kept in memory.
+        :param dead_letter_path: A file dead letters are appended to as JSON lines, None keeps them in memory only.
+        :param drain_timeout: The seconds stop waits for scheduled replies.
+        """
+        self.whatsapp_handler = whatsapp_handler
+        self.sender_rate = sender_rate
+        self.sender_burst = sender_burst
+        self.account_bucket = TokenBucket(account_rate, account_burst)
+        self.sender_buckets = {}
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self.dead_letter_path = dead_letter_path
+        self.drain_timeout = drain_timeout
+        # Sender number -> heap of (priority, sequence, delivery) waiting for tokens, and the task dispatching them
+        self.queues = {}
+        # Keeps replies of equal priority in scheduling order
+        self.counter = itertools.count()
+        self.dispatchers = {}
+        self.recipient_locks = {}
+        self.deliveries = set()
+        self.running = False
+
+    def send(self, to: str, from_: str, body: str, priority: int = INTERACTIVE) -> asyncio.Future:
+        """
+        Schedule a reply.
+
+        :param priority: INTERACTIVE for replies to a user message, BULK for bulk or proactive messages.
+
+        :return: A future resolved with the message SIDs once the reply is delivered, or None if it was dead-lettered.
+        """
+        if not self.running:
+            raise RuntimeError("DeliveryScheduler is not started")
+
+        delivery = Delivery(to, from_, self.whatsapp_handler.split_message(body), priority)
+        heapq.heappush(self.queues.setdefault(from_, []), (priority, next(self.counter), delivery))
+        # A sender is dispatched while it has replies waiting
+        if from_ not in self.dispatchers:
+            self.dispatchers[from_] = asyncio.create_task(self._dispatch(from_))
+        return delivery.future
+
+    @property
+    def scheduled(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    async def start(self):
+        self.running = True
+
+    async def stop(self):
+        """
+        Wait for the scheduled replies, then stop dispatching.
+        """
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping with {self.scheduled} replies still scheduled")
+        self.running = False
+
+        tasks = list(self.dispatchers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _drain(self):
+        while self.dispatchers or self.deliveries:
+            await asyncio.gather(*list(self.dispatchers.values()), *list(self.deliveries), return_exceptions=True)
+
+    async def _dispatch(self, from_: str):
+        queue = self.queues[from_]
+        sender_bucket = self.sender_buckets.get(from_)
+        if sender_bucket is None:
+            sender_bucket = self.sender_buckets[from_] = TokenBucket(self.sender_rate, self.sender_burst)
+
+        try:
+            while queue:
+                # A reply of higher priority scheduled while waiting is sent first
+                while True:
+                    delivery = queue[0][2]
+                    await self._wait_for_tokens(sender_bucket, len(delivery.chunks))
+                    if queue[0][2] is delivery:
+                        break
+                heapq.heappop(queue)
+                self._take_tokens(sender_bucket, len(delivery.chunks))
+
+                task = asyncio.create_task(self._deliver(delivery))
+                self.deliveries.add(task)
+                task.add_done_callback(self.deliveries.discard)
+        finally:
+            del self.dispatchers[from_]
+            if not queue:
+                del self.queues[from_]
+
+    async def _wait_for_tokens(self, sender_bucket: TokenBucket, tokens: int):
+        while True:
+            delay = max(sender_bucket.delay(tokens), self.account_bucket.delay(tokens))
+            if delay == 0:
+                break
+            await asyncio.sleep(delay)
+
+    def _take_tokens(self, sender_bucket: TokenBucket, tokens: int):
+        sender_bucket.take(tokens)
+        self.account_bucket.take(tokens)
+
+    async def _deliver(self, delivery: Delivery):
+        # Locks are FIFO, replies to one recipient go out in scheduling order
+        lock, waiting = self.recipient_locks.get(delivery.to, (asyncio.Lock(), 0))
+        self.recipient_locks[delivery.to] = (lock, waiting + 1)
+        message_sids = []
+        async with lock:
+            try:
+                for chunk in delivery.chunks:
+                    message_sids.append(await self.whatsapp_handler.send_chunk(body=chunk, from_=delivery.from_, to=delivery.to))
+                    delivery.sent += 1
+            except Exception as e:
+                # send_chunk already retried the message, the rest of the reply is given up
+                delivery.error = str(e)
+                self._dead_letter(delivery)
+
+        lock, waiting = self.recipient_locks[delivery.to]
+        if waiting == 1:
+            del self.recipient_locks[delivery.to]
+        else:
+            self.recipient_locks[delivery.to] = (lock, waiting - 1)
+
+        if not delivery.future.done():
+            delivery.future.set_result(message_sids if delivery.sent == len(delivery.chunks) else None)
+
+    def _dead_letter(self, delivery: Delivery):
+        record = {
+            "to": delivery.to,
+            "from": delivery.from_,
+            "chunks": delivery.chunks[delivery.sent:],
+            "priority": delivery.priority,
+            "error": delivery.error,
+            "time": time.time(),
+        }
+        logger.error(f"Giving up delivery to {delivery.to}: {delivery.error}")
+        self.dead_letters.append(record)
+
+        if self.dead_letter_path:
+            try:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                logger.error(f"Error writing dead letter: {e}")
+
+
+__all__ = ['DeliveryScheduler', 'TokenBucket', 'INTERACTIVE', 'BULK']
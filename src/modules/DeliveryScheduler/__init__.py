@@ -0,0 +1 @@
+from .DeliveryScheduler import DeliveryScheduler, TokenBucket, INTERACTIVE, BULK
@@ -0,0 +1,151 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from typing import Dict
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the records of an event (or of a logger, for records without event),
+    records carry their event name in extra={"event": ...}. Warnings and errors are always kept.
+    """
+    def __init__(self, sample_rates: Dict[str, float]):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.sample_rates.get(getattr(record, "event", None) or record.name)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most burst records of an event (or of a logger, for records without event) through,
+    refilled at rate records per second. Warnings and errors are never limited.
+    """
+    def __init__(self, rate: float = 20.0, burst: int = 100):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = getattr(record, "event", None) or record.name
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            self.dropped += 1
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Appends the event name and the structured fields of a record (extra={"fields": {...}}) as JSON.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        structured = dict(getattr(record, "fields", None) or {})
+        if getattr(record, "event", None):
+            structured["event"] = record.event
+        if structured:
+            message += " " + json.dumps(structured, default=str)
+        return message
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the background writer, drops them instead of blocking when the queue is full.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Routes all logging through a bounded queue written by a background thread,
+    so logging calls on the request path never wait for the output.
+    """
+    def __init__(self, level: int = logging.INFO, max_queue_size: int = 10000,
+                 sample_rates: Dict[str, float] = None, rate: float = 20.0, burst: int = 100,
+                 fmt: str = '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                 routed_loggers=("uvicorn", "uvicorn.error", "uvicorn.access")):
+        """
+        :param level: The root logger level.
+        :param max_queue_size: The number of records waiting for the writer before new ones are dropped.
+        :param sample_rates: The fraction of records kept per event name, or per logger name for records without event.
+        Only records at or above level reach the sampling.
+        :param rate: The records per second let through per event.
+        :param burst: The records let through at once per event.
+        :param fmt: The format of the written records.
+        :param routed_loggers: Loggers that come with handlers of their own (uvicorn writes to stderr directly),
+        their handlers are removed so their records go through the queue as well.
+        """
+        self.level = level
+        self.routed_loggers = routed_loggers
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.handler.addFilter(SamplingFilter(sample_rates or {}))
+        self.handler.addFilter(RateLimitFilter(rate, burst))
+
+        self.output = logging.StreamHandler()
+        self.output.setFormatter(StructuredFormatter(fmt))
+        self.listener = logging.handlers.QueueListener(self.queue, self.output, respect_handler_level=True)
+        self.running = False
+
+    def install(self):
+        """
+        Replace the root handlers with the queue and start the writer thread.
+        Servers that configure logging themselves must be started without their logging config,
+        e.g. uvicorn.run(..., log_config=None).
+        """
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        for name in self.routed_loggers:
+            routed = logging.getLogger(name)
+            for handler in list(routed.handlers):
+                routed.removeHandler(handler)
+            routed.propagate = True
+        self.listener.start()
+        self.running = True
+        return self
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        """
+        Write the queued records and stop the writer thread.
+        Records logged afterwards, like the server shutdown messages, are written directly.
+        """
+        if self.running:
+            root = logging.getLogger()
+            root.removeHandler(self.handler)
+            root.addHandler(self.output)
+            self.listener.stop()
+            self.running = False
+
+
+__all__ = ['LogPipeline', 'SamplingFilter', 'RateLimitFilter', 'StructuredFormatter']
@@ -0,0 +1 @@
+from .LogPipeline import LogPipeline, SamplingFilter, RateLimitFilter, StructuredFormatter
@@ -1,5 +1,16 @@
+import asyncio
+
 from mem0 import Memory
 
+
+async def call_memory(method, *args, **kwargs):
+    """
+    Call a method of a mem0 client on a worker thread, the mem0 clients are synchronous
+    and would block the event loop.
+    """
+    return await asyncio.to_thread(method, *args, **kwargs)
+
+
 class MemoryClient:
     def __init__(self, memory: Memory):
         self.memory = memory
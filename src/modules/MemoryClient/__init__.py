@@ -1 +1 @@
-from .MemoryClient import MemoryClient
\ No newline at end of file
+from .MemoryClient import MemoryClient, call_memory
@@ -0,0 +1,79 @@
+import asyncio
+from typing import List
+
+from ..Session import Session
+from ..BackgroundBatcher import BackgroundBatcher
+from ..MemoryClient import call_memory
+
+
+class MemoryWriteBehind(BackgroundBatcher):
+    """
+    Buffers the memories saved by the assistant per user and writes them to the memory service
+    in background batches, one call per user.
+    Memories are visible through pending until their write completes.
+    """
+    def __init__(self, batch_size: int = 10, flush_interval: float = 5.0, max_attempts: int = 3):
+        """
+        :param batch_size: The number of buffered memories that triggers a flush.
+        :param flush_interval: The longest a memory waits before it is written.
+        :param max_attempts: The number of write attempts of a memory before it is given up.
+        """
+        super().__init__(batch_size, flush_interval, max_attempts)
+        # user_id -> (latest session of the user, [(memory, attempts)])
+        self.buffers = {}
+        # user_id -> memories being written
+        self.writing = {}
+
+    def save(self, session: Session, memory: str):
+        """
+        Buffer a memory of the session user, it is written in the background.
+        """
+        _, memories = self.buffers.get(session.user_id, (None, []))
+        memories.append((memory, 0))
+        self.buffers[session.user_id] = (session, memories)
+        self.notify()
+
+    def queued(self) -> int:
+        return sum(len(memories) for _, memories in self.buffers.values())
+
+    def pending(self, user_id: str) -> List[str]:
+        """
+        The memories of the user that are not written yet, oldest first.
+        """
+        _, memories = self.buffers.get(user_id, (None, []))
+        return self.writing.get(user_id, []) + [memory for memory, _ in memories]
+
+    async def flush(self):
+        """
+        Write the buffered memories of every user.
+        """
+        buffers, self.buffers = self.buffers, {}
+        if not buffers:
+            return
+
+        await asyncio.gather(*[self._write(user_id, session, memories) for user_id, (session, memories) in buffers.items()])
+
+    async def _write(self, user_id: str, session: Session, memories: list):
+        texts = [memory for memory, _ in memories]
+        self.writing[user_id] = self.writing.get(user_id, []) + texts
+        try:
+            await call_memory(session.memory_client.add, [{"role": "user", "content": text} for text in texts],
+                              user_id=user_id)
+            # Cached retrievals of the user may miss the new memories
+            session.memory_cache.clear()
+        except Exception as e:
+            retry = [(memory, attempts + 1) for memory, attempts in memories
+                     if self.should_retry(attempts + 1, f"saved memory of user {user_id}", e)]
+            if retry:
+                # Retried before the memories saved in the meantime
+                latest, saved = self.buffers.get(user_id, (session, []))
+                self.buffers[user_id] = (latest, retry + saved)
+        finally:
+            writing = self.writing[user_id][len(texts):]
+            if writing:
+                self.writing[user_id] = writing
+            else:
+                del self.writing[user_id]
+
+
+__all__ = ['MemoryWriteBehind']
@@ -0,0 +1 @@
+from .MemoryWriteBehind import MemoryWriteBehind
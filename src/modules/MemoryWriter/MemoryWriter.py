@@ -0,0 +1,89 @@
+import asyncio
+from collections import deque
+from typing import List
+
+from ..Session import Session
+from ..ConversationBuffer import Turn
+from ..BackgroundBatcher import BackgroundBatcher
+from ..MemoryClient import call_memory
+
+
+class MemoryWriter(BackgroundBatcher):
+    """
+    Persists the turns evicted from the session conversation buffers to the short-term memory in the background.
+    The consecutive turns of a session are written together, failed writes are retried on the next flush.
+    """
+    def __init__(self, batch_size: int = 20, flush_interval: float = 10.0, max_attempts: int = 3):
+        """
+        :param batch_size: The number of turns written at the same time.
+        :param flush_interval: The longest a turn waits before it is written, the turns evicted
+        from a session in the meantime are written in the same call.
+        :param max_attempts: The number of write attempts of a turn before it is given up.
+        """
+        super().__init__(batch_size, flush_interval, max_attempts)
+        self.pending = deque()
+
+    def enqueue(self, session: Session, turns: List[Turn]):
+        for turn in turns:
+            self.pending.append((session, turn, 0))
+        self.notify()
+
+    def queued(self) -> int:
+        return len(self.pending)
+
+    async def stop(self):
+        """
+        Stop without writing the queued turns, every session is torn down on shutdown
+        and its short-term memory deleted, so writing them would be wasted.
+        """
+        self.pending.clear()
+        await super().stop()
+
+    async def flush(self):
+        """
+        Write one batch of turns, with one call per session for its consecutive turns.
+        """
+        batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.batch_size))]
+        if not batch:
+            return
+
+        # Group by session, the turns of a session stay in order
+        groups = {}
+        for session, turn, attempts in batch:
+            # The short-term memory of an ended session is deleted, writing it would leave orphans
+            if session.ended:
+                continue
+            groups.setdefault(id(session), (session, []))[1].append((turn, attempts))
+
+        results = await asyncio.gather(*[self._write(session, [turn for turn, _ in turns]) for session, turns in groups.values()],
+                                       return_exceptions=True)
+
+        for (session, turns), result in zip(groups.values(), results):
+            if not isinstance(result, Exception):
+                continue
+            for turn, attempts in turns:
+                if self.should_retry(attempts + 1, f"memory write of turn {turn.index} of session {session.session_id}", result):
+                    self.pending.append((session, turn, attempts + 1))
+
+    async def _write(self, session: Session, turns: List[Turn]):
+        """
+        Store only the messages of the given turns, the earlier conversation is referenced by turn index.
+        """
+        messages = []
+        for turn in turns:
+            messages.append({"role": "user", "content": turn.user})
+            messages.append({"role": "assistant", "content": turn.assistant})
+
+        metadata = {
+            "type": "short_term",
+            "first_turn": turns[0].index,
+            "last_turn": turns[-1].index,
+            "previous_turn": turns[0].index - 1 if turns[0].index > 0 else None,
+        }
+
+        await call_memory(session.memory_client.add, messages, run_id=session.session_id,
+                          user_id=session.user_id, metadata=metadata)
+        session.memory_cache.clear()
+
+
+__all__ = ['MemoryWriter']
@@ -0,0 +1 @@
+from .MemoryWriter import MemoryWriter
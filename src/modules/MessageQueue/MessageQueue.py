@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class MessageQueue:
+    """
+    Bounded queue of inbound messages processed by a pool of asyncio workers.
+    Messages with the same key are handled one batch after another in submission order,
+    messages with different keys are handled concurrently.
+
+    The messages of a key queued while its previous batch is handled, or within the
+    debounce period of each other, are handed to the handler together as one batch.
+    """
+    def __init__(self, handler: Callable[[List[Tuple]], Awaitable[Any]], workers: int = 8, max_depth: int = 1000,
+                 drain_timeout: float = 30.0, debounce_period: float = 0.0, max_debounce_delay: float = 5.0,
+                 max_batch: int = 10):
+        """
+        :param handler: The coroutine function called with a list of the argument tuples of the batched messages.
+        :param workers: The number of batches handled at the same time.
+        :param max_depth: The number of queued messages after which submit raises QueueFullError.
+        :param drain_timeout: The seconds stop waits for queued messages before cancelling the workers.
+        :param debounce_period: The seconds a key waits for more messages after its latest one, 0 disables the wait.
+        :param max_debounce_delay: The longest a key waits for more messages after its first one.
+        :param max_batch: The largest number of messages handed to the handler at once.
+        """
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.drain_timeout = drain_timeout
+        self.debounce_period = debounce_period
+        self.max_debounce_delay = max_debounce_delay
+        self.max_batch = max_batch
+        # Keys are in pending while they have messages queued or a batch being handled
+        self.pending = {}
+        # Keys waiting for the end of their debounce period, with the timer and the time of the first message
+        self.timers = {}
+        self.ready = None
+        self.depth = 0
+        self.tasks = []
+
+    def submit(self, key: str, *args):
+        """
+        Queue a message for the handler.
+
+        :param key: The ordering key, usually the sender.
+        :raises QueueFullError: When max_depth messages are already queued.
+        """
+        if self.ready is None:
+            raise RuntimeError("MessageQueue is not started")
+        if self.depth >= self.max_depth:
+            raise QueueFullError(f"Message queue is full ({self.depth} messages)")
+
+        self.depth += 1
+        if key in self.pending:
+            # Joins the next batch of the key
+            self.pending[key].append(args)
+            if key in self.timers:
+                self._debounce(key)
+        else:
+            self.pending[key] = deque([args])
+            if self.debounce_period > 0:
+                self._debounce(key)
+            else:
+                self.ready.put_nowait(key)
+
+    def _debounce(self, key: str):
+        """
+        (Re)start the wait of a key for more messages, bounded by max_debounce_delay.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        timer, first_time = self.timers.pop(key, (None, now))
+        if timer is not None:
+            timer.cancel()
+
+        delay = min(self.debounce_period, first_time + self.max_debounce_delay - now)
+        self.timers[key] = (loop.call_later(max(delay, 0), self._release, key), first_time)
+
+    def _release(self, key: str):
+        self.timers.pop(key, None)
+        self.ready.put_nowait(key)
+
+    async def start(self):
+        if not self.tasks:
+            self.ready = asyncio.Queue()
+            self.tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Wait for the queued messages, then stop the workers.
+        """
+        if not self.tasks:
+            return
+
+        # Hand the debounced keys to the workers right away
+        for key in list(self.timers):
+            self.timers[key][0].cancel()
+            self._release(key)
+
+        try:
+            await asyncio.wait_for(self.ready.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping with {self.depth} messages still queued")
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _work(self):
+        while True:
+            key = await self.ready.get()
+            messages = self.pending[key]
+            batch = [messages.popleft() for _ in range(min(len(messages), self.max_batch))]
+            try:
+                await self.handler(batch)
+            except Exception as e:
+                logger.error(f"Error handling queued messages: {e}")
+            finally:
+                self.depth -= len(batch)
+                if messages:
+                    self.ready.put_nowait(key)
+                else:
+                    del self.pending[key]
+                self.ready.task_done()
+
+
+__all__ = ['MessageQueue', 'QueueFullError']
@@ -0,0 +1 @@
+from .MessageQueue import MessageQueue, QueueFullError
@@ -1,79 +1,278 @@
 import os
-import time
 import json
-from openai import OpenAI
+import asyncio
+import logging
+import inspect
+from typing import Any, Callable, Union
+from openai import OpenAI, AsyncOpenAI
 
 from ..ToolManager.ToolManager import ToolManager
 
 from ..Session import Session
 
+logger = logging.getLogger(__name__)
+
+# Run statuses after which the run produces no answer
+FAILED_RUN_STATUSES = ("failed", "cancelled", "expired", "incomplete")
 
 class OpenAIHandler:
-    def __init__(self, tool_manager: ToolManager, sleep_period=0.5) -> None:
+    def __init__(self, tool_manager: ToolManager, sleep_period=0.5, use_async=False,
+                 initial_sleep_period=0.1, backoff_factor=1.5, stream=False,
+                 min_segment_length=200, max_segment_length=1500) -> None:
+        """
+        :param tool_manager: The ToolManager used to execute assistant tool calls.
+        :param sleep_period: The longest pause between two run status polls.
+        :param use_async: Use the session's AsyncOpenAI client instead of the sync one.
+        :param initial_sleep_period: The pause before the first poll, grows by backoff_factor up to sleep_period.
+        :param backoff_factor: The factor applied to the pause after every poll.
+        :param stream: Use the run event stream (query_stream) instead of polling.
+        :param min_segment_length: The shortest text segment handed out while streaming, unless the message ends.
+        :param max_segment_length: The length after which a segment is cut at the last sentence end.
+        """
         self.tool_manager = tool_manager
         self.sleep_period = sleep_period
+        self.use_async = use_async
+        self.initial_sleep_period = min(initial_sleep_period, sleep_period)
+        self.backoff_factor = backoff_factor
+        self.stream = stream
+        self.min_segment_length = min_segment_length
+        self.max_segment_length = max_segment_length
         self.client = None
 
 
-    async def query(self, query: str, session: Session, **kwargs):
-        openai_client = session.openai_client
+    async def query(self, query: str, session: Session, run_options: dict = None, **kwargs):
+        """
+        :param run_options: Extra parameters of the run, e.g. additional_instructions or truncation_strategy.
+        """
+        openai_client = self._get_client(session)
         assistant_id = session.assistant_id
 
-        thread = openai_client.beta.threads.create()
+        async with session.turn_lock:
+            thread_id = await self._add_user_message(query, openai_client, session)
 
-        openai_client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=query,
-        )
+            run = await self._call(openai_client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                **(run_options or {}),
+            ))
+
+            run = await self._wait_on_run(thread_id, run, openai_client, session)
+
+            # Only the messages of this run, the thread holds the whole conversation
+            messages = await self._call(openai_client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id))
+            session.thread_messages += len(messages.data)
+            return [msg.content[0].text.value for msg in messages.data]
+
+    async def query_stream(self, query: str, session: Session, on_segment: Callable[[str], Any], run_options: dict = None, **kwargs):
+        """
+        Run the assistant on the run event stream and hand every finished paragraph
+        (or group of sentences) to on_segment as soon as it is generated.
+
+        :param query: The user message.
+        :param session: The user session.
+        :param on_segment: Called with each text segment, may be a coroutine function.
+        :param run_options: Extra parameters of the run, e.g. additional_instructions or truncation_strategy.
+        :return: A list with the full assistant answer, like query.
+        """
+        openai_client = self._get_client(session)
+        assistant_id = session.assistant_id
+
+        async with session.turn_lock:
+            return await self._stream_run(query, openai_client, assistant_id, session, on_segment, run_options)
+
+    async def _stream_run(self, query: str, openai_client, assistant_id: str, session: Session, on_segment: Callable[[str], Any],
+                          run_options: dict = None):
+        thread_id = await self._add_user_message(query, openai_client, session)
 
-        run = openai_client.beta.threads.runs.create(
-            thread_id=thread.id,
+        stream = await self._call(openai_client.beta.threads.runs.create(
+            thread_id=thread_id,
             assistant_id=assistant_id,
-        )
+            stream=True,
+            **(run_options or {}),
+        ))
+
+        text = ""
+        buffer = ""
+        while stream is not None:
+            next_stream = None
+            async for event in self._iterate(stream):
+                if event.event == "thread.message.delta":
+                    for part in event.data.delta.content or []:
+                        if part.type == "text" and part.text and part.text.value:
+                            text += part.text.value
+                            buffer += part.text.value
+
+                    segments, buffer = self._split_segments(buffer)
+                    for segment in segments:
+                        await self._call(on_segment(segment))
+
+                elif event.event == "thread.message.completed":
+                    session.thread_messages += 1
+                    segments, buffer = self._split_segments(buffer, final=True)
+                    for segment in segments:
+                        await self._call(on_segment(segment))
+
+                elif event.event == "thread.run.requires_action":
+                    run = event.data
+                    tool_call_reqs = await self._handle_tool_calls(run, session=session)
+
+                    # Submitting the tool outputs resumes the run on a new stream
+                    next_stream = await self._call(openai_client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=run.id,
+                        tool_outputs=tool_call_reqs,
+                        stream=True,
+                    ))
+
+                elif event.event in [f"thread.run.{status}" for status in FAILED_RUN_STATUSES]:
+                    raise Exception(f"Assistant run ended with status {event.data.status}: {event.data.last_error}")
+
+            stream = next_stream
+
+        segments, buffer = self._split_segments(buffer, final=True)
+        for segment in segments:
+            await self._call(on_segment(segment))
+
+        return [text]
 
-        run = await self._wait_on_run(thread, run, openai_client, session)
+    def _split_segments(self, buffer: str, final: bool = False):
+        """
+        Cut the finished segments off the start of the streamed text.
 
-        messages = openai_client.beta.threads.messages.list(thread_id=thread.id)
-        return [msg.content[0].text.value for msg in messages.data]
+        :param buffer: The text received and not yet handed out.
+        :param final: Hand out everything, the message is complete.
+        :return: The list of finished segments and the remaining buffer.
+        """
+        segments = []
+        while True:
+            if final:
+                if buffer.strip():
+                    segments.append(buffer.strip())
+                return segments, ""
 
-    async def _wait_on_run(self, thread, run, openai_client: OpenAI, session: Session):
+            # Prefer paragraph boundaries once the segment is long enough
+            cut = buffer.rfind("\n\n", 0, self.max_segment_length)
+            if cut < self.min_segment_length:
+                cut = -1
+
+            # Fall back to the last sentence end when the buffer grows too long
+            if cut == -1 and len(buffer) >= self.max_segment_length:
+                cut = max(buffer.rfind(end, 0, self.max_segment_length) for end in (". ", "! ", "? ", "\n"))
+                if cut <= 0:
+                    cut = self.max_segment_length
+                else:
+                    cut += 1
+
+            if cut == -1:
+                return segments, buffer
+
+            segment, buffer = buffer[:cut].strip(), buffer[cut:].lstrip()
+            if segment:
+                segments.append(segment)
+
+    async def _iterate(self, stream):
+        """
+        Iterate over the events of a sync or async run stream.
+        """
+        if hasattr(stream, "__aiter__"):
+            async for event in stream:
+                yield event
+        else:
+            for event in stream:
+                yield event
+
+    async def _add_user_message(self, query: str, openai_client, session: Session) -> str:
+        """
+        Append the user message to the session thread, creating the thread on the first turn.
+
+        :return: The thread id.
+        """
+        if session.thread_id is None:
+            thread = await self._call(openai_client.beta.threads.create())
+            session.thread_id = thread.id
+
+        await self._call(openai_client.beta.threads.messages.create(
+            thread_id=session.thread_id,
+            role="user",
+            content=query,
+        ))
+        session.thread_messages += 1
+        return session.thread_id
+
+    async def _wait_on_run(self, thread_id: str, run, openai_client: Union[OpenAI, AsyncOpenAI], session: Session):
+        delay = self.initial_sleep_period
         while run.status != "completed":
-            print(run.status)  
-            run = openai_client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
+            if run.status in FAILED_RUN_STATUSES:
+                raise Exception(f"Assistant run ended with status {run.status}: {run.last_error}")
+
+            logger.debug(f"Run {run.id} status: {run.status}", extra={"event": "run.poll", "fields": {"status": run.status}})
+            run = await self._call(openai_client.beta.threads.runs.retrieve(
+                thread_id=thread_id,
                 run_id=run.id,
-            )
-            
+            ))
+
             if run.required_action:
                 tool_call_reqs = await self._handle_tool_calls(run, session=session)
 
                 # Submit the tool output
-                run = openai_client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread.id,
+                run = await self._call(openai_client.beta.threads.runs.submit_tool_outputs(
+                    thread_id=thread_id,
                     run_id=run.id,
                     tool_outputs=tool_call_reqs,
-                )
+                ))
+
+                # The run resumes after the tool outputs, poll quickly again
+                delay = self.initial_sleep_period
+
+            await asyncio.sleep(delay)
+            delay = min(delay * self.backoff_factor, self.sleep_period)
 
-            time.sleep(self.sleep_period)
-        
         return run
 
     async def _handle_tool_calls(self, run, **kwargs):
-        tool_call_reqs = []
-        for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-            print("Call ", tool_call.function)
+        tool_calls = run.required_action.submit_tool_outputs.tool_calls
+
+        # All tool calls of one required action run at the same time
+        return list(await asyncio.gather(*[self._handle_tool_call(tool_call, **kwargs) for tool_call in tool_calls]))
 
+    async def _handle_tool_call(self, tool_call, **kwargs):
+        """
+        Execute a single tool call, a failing or timed out tool returns an error output
+        so the remaining tool calls and the run carry on.
+        """
+        logger.info(f"Call {tool_call.function.name}", extra={"event": "tool.call"})
+
+        try:
             # Execute the tool
             tool_params = json.loads(tool_call.function.arguments)
             tool_result = await self.tool_manager.use_tool(tool_call.function.name, **tool_params, **kwargs)
+            output = {"result": tool_result}
+        except asyncio.TimeoutError:
+            output = {"error": {"type": "timeout", "message": f"Tool '{tool_call.function.name}' timed out."}}
+        except Exception as e:
+            output = {"error": {"type": type(e).__name__, "message": str(e)}}
+
+        return {
+            "tool_call_id": tool_call.id,
+            "output": json.dumps(output, default=str)
+        }
+
+    def _get_client(self, session: Session):
+        """
+        Return the client matching the handler mode, falling back to the sync client
+        when the session was built without an async one.
+        """
+        if self.use_async and session.async_openai_client is not None:
+            return session.async_openai_client
+        return session.openai_client
+
+    async def _call(self, result):
+        """
+        Await the result of an OpenAI client call when it comes from the async client.
+        """
+        if inspect.isawaitable(result):
+            return await result
+        return result
 
-            tool_call_dict = {
-                "tool_call_id": tool_call.id,
-                "output": json.dumps({"result": tool_result})
-            }
-            tool_call_reqs.append(tool_call_dict)
-        return tool_call_reqs
-    
 
 __all__ = ['OpenAiHandler']
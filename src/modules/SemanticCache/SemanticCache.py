@@ -0,0 +1,106 @@
+import math
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticCache:
+    """
+    A small LRU cache of query results, matched on the exact query or on the similarity of the query embeddings.
+    Entries expire after a time to live, the cache is cleared when the underlying data changes.
+    """
+    MISSING = object()
+
+    def __init__(self, max_size: int = 64, ttl: float = 300.0, similarity_threshold: float = 0.92):
+        """
+        :param max_size: The number of results kept, the least recently used result is evicted first.
+        :param ttl: The time to live of a result in seconds.
+        :param similarity_threshold: The lowest cosine similarity of two query embeddings considered the same query.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # Normalized query -> (embedding, result, expires_at)
+        self.entries = OrderedDict()
+        # Incremented by every clear
+        self.generation = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def get(self, query: str):
+        """
+        Return the result of the exact query, or SemanticCache.MISSING.
+        """
+        key = self._key(query)
+        entry = self.entries.get(key)
+        if entry is None or entry[2] <= time.monotonic():
+            self.entries.pop(key, None)
+            return self.MISSING
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get_similar(self, embedding: Optional[List[float]]):
+        """
+        Return the result of the most similar cached query above the threshold, or SemanticCache.MISSING.
+        """
+        best, best_similarity = None, self.similarity_threshold
+        now = time.monotonic()
+        for key, (cached_embedding, _, expires_at) in list(self.entries.items()):
+            if expires_at <= now:
+                del self.entries[key]
+                continue
+            if embedding is None or cached_embedding is None:
+                continue
+            similarity = cosine_similarity(embedding, cached_embedding)
+            if similarity >= best_similarity:
+                best, best_similarity = key, similarity
+
+        if best is None:
+            self.misses += 1
+            return self.MISSING
+
+        self.entries.move_to_end(best)
+        self.similar_hits += 1
+        return self.entries[best][1]
+
+    def set(self, query: str, embedding: Optional[List[float]], result, generation: int = None):
+        """
+        Cache the result of a query.
+
+        :param generation: The generation the result was read at, the result is dropped when the cache was cleared since.
+        """
+        if generation is not None and generation != self.generation:
+            return
+
+        key = self._key(query)
+        self.entries[key] = (embedding, result, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.generation += 1
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.similar_hits + self.misses
+        return (self.hits + self.similar_hits) / lookups if lookups else 0.0
+
+    def _key(self, query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+__all__ = ['SemanticCache', 'cosine_similarity']
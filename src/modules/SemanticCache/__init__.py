@@ -0,0 +1 @@
+from .SemanticCache import SemanticCache, cosine_similarity
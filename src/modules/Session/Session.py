@@ -1,19 +1,45 @@
+import asyncio
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from mem0 import Memory
 
 from mem0 import MemoryClient
 
+from ..ConversationBuffer import ConversationBuffer
+from ..SemanticCache import SemanticCache
+from ..ClientPool import ClientPool
+
 class Session:
-    def __init__(self, session_id: str, user_id: str, openai_client: OpenAI, assistant_id: str, memory_client: MemoryClient) -> None:
+    def __init__(self, session_id: str, user_id: str, openai_client: OpenAI, assistant_id: str, memory_client: MemoryClient, async_openai_client: AsyncOpenAI = None, conversation: ConversationBuffer = None, client_pool: ClientPool = None) -> None:
         self.session_id = session_id
         self.user_id = user_id
         self.openai_client = openai_client
+        self.async_openai_client = async_openai_client
         self.assistant_id = assistant_id
         self.memory_client = memory_client
+        # The assistant thread of the session, created on the first turn and reused until the session expires
+        self.thread_id = None
+        # Serializes the turns of the session, a thread accepts no new message while a run is active
+        self.turn_lock = asyncio.Lock()
+        # The recent turns of the session, older turns are persisted to the short-term memory
+        self.conversation = conversation if conversation is not None else ConversationBuffer()
+        # Recent retrieve_memory results, cleared when the memories of the user change
+        self.memory_cache = SemanticCache()
+        # The messages added to the thread and not yet counted by a conversation turn,
+        # including those of runs that failed
+        self.thread_messages = 0
+        # Set once the session is queued for teardown
+        self.ended = False
+        # The pool the clients were taken from, they are released once the session is torn down
+        self.client_pool = client_pool
 
-    def __del__(self):
-        self.memory_client.delete_all(run_id=self.session_id)
+    def release_clients(self):
+        """
+        Hand the clients back to the pool they were taken from, the session must not use them afterwards.
+        """
+        if self.client_pool is not None:
+            self.client_pool.release(self.openai_client, self.async_openai_client, self.memory_client)
+            self.client_pool = None
         
 
     
@@ -1,22 +1,32 @@
 from ..Session import Session
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 from mem0 import MemoryClient
 
+from ..ConversationBuffer import ConversationBuffer
+from ..ClientPool import ClientPool
+
 # Follow builder pattern to create a session
 class SessionBuilder:
     def __init__(self):
         self.openai_client = None
+        self.async_openai_client = None
         self.assistant_id = None
         self.user_id = None
         self.memory_client = None
         self.session_id = None
+        self.conversation = None
+        self.client_pool = None
 
 
     def set_openai_client(self, openai_client: OpenAI):
         self.openai_client = openai_client
         return self
     
+    def set_async_openai_client(self, async_openai_client: AsyncOpenAI):
+        self.async_openai_client = async_openai_client
+        return self
+
     def set_assistant_id(self, assistant_id: str):
         self.assistant_id = assistant_id
         return self
@@ -29,6 +39,14 @@ class SessionBuilder:
         self.session_id = session_id
         return self
     
+    def set_conversation(self, conversation: ConversationBuffer):
+        self.conversation = conversation
+        return self
+
+    def set_client_pool(self, client_pool: ClientPool):
+        self.client_pool = client_pool
+        return self
+
     def set_user_id(self, user_id: str):
         self.user_id = user_id
         return self
@@ -37,9 +55,12 @@ class SessionBuilder:
     def build(self):
         return Session(session_id=self.session_id, 
                         openai_client=self.openai_client,
+                        async_openai_client=self.async_openai_client,
                         assistant_id=self.assistant_id,
                         user_id=self.user_id, 
-                        memory_client=self.memory_client)    
+                        memory_client=self.memory_client,
+                        conversation=self.conversation,
+                        client_pool=self.client_pool)    
 
     
 
@@ -3,27 +3,42 @@ import time
 from ..SessionBuilder import SessionBuilder
 from ..Session import Session
 from ..User import User
-
-from openai import OpenAI
-from mem0 import MemoryClient
+from ..ClientPool import ClientPool
+from ..ConversationBuffer import ConversationBuffer
 
 class SessionFactory:
-    def __init__(self, session_builder: SessionBuilder):
+    def __init__(self, session_builder: SessionBuilder, base_url: str = None, client_pool: ClientPool = None,
+                 conversation_turns: int = 20, conversation_tokens: int = 4000):
+        """
+        :param base_url: The OpenAI base URL of new sessions, None uses the default endpoint.
+        Replacing it only affects sessions created afterwards.
+        :param client_pool: The registry the session clients are taken from, shared by all sessions.
+        :param conversation_turns: The number of recent turns a session keeps in process.
+        :param conversation_tokens: The token budget of the recent turns a session keeps in process.
+        """
         self.session_builder = session_builder
+        self.base_url = base_url
+        self.client_pool = client_pool or ClientPool()
+        self.conversation_turns = conversation_turns
+        self.conversation_tokens = conversation_tokens
 
     def create_standard_session(self, user: User) -> Session:
-        openai_client = OpenAI(api_key=user.api_keys['openai_api_key'])
-        memory_client = MemoryClient(user.api_keys['mem0_api_key'])
+        openai_client = self.client_pool.get_openai_client(user.api_keys['openai_api_key'], base_url=self.base_url)
+        async_openai_client = self.client_pool.get_async_openai_client(user.api_keys['openai_api_key'], base_url=self.base_url)
+        memory_client = self.client_pool.get_memory_client(user.api_keys['mem0_api_key'])
 
         session_id = f"{user.phone_number}-{int(time.time())}"
         user_id = user.phone_number
 
         session = self.session_builder\
             .set_openai_client(openai_client)\
+            .set_async_openai_client(async_openai_client)\
             .set_assistant_id(user.assistant_id)\
             .set_memory_client(memory_client)\
             .set_session_id(session_id)\
             .set_user_id(user_id)\
+            .set_conversation(ConversationBuffer(self.conversation_turns, self.conversation_tokens))\
+            .set_client_pool(self.client_pool)\
             .build()
         
         return session
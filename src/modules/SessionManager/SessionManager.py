@@ -1,5 +1,8 @@
+import asyncio
 import time
+from collections import OrderedDict
 from ..Session import Session
+from ..TeardownQueue import TeardownQueue
 
 import logging
 
@@ -8,9 +11,14 @@ logger = logging.getLogger(__name__)
 
 
 class SessionManager:
-    def __init__(self, timeout:float =180):
-        self.sessions = {}
+    def __init__(self, timeout:float =180, sweep_interval: float = 30.0, teardown_queue: TeardownQueue = None):
+        # Ordered by last refresh, the session closest to expiry comes first
+        self.sessions = OrderedDict()
+        # Ended sessions release their short-term memory in the background
+        self.teardown_queue = teardown_queue or TeardownQueue()
         self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self.task = None
 
     def create_session(self, session: Session):
         """
@@ -24,6 +32,10 @@ class SessionManager:
 
         logger.info(f"Creating session: {session.user_id}")
 
+        # Re-insert so a replaced session moves to the end of the expiry order
+        replaced = self.sessions.pop(session.user_id, None)
+        if replaced is not None and replaced['session'] is not session:
+            self.teardown_queue.enqueue(replaced['session'])
         self.sessions[session.user_id] = session_obj
 
 
@@ -35,13 +47,13 @@ class SessionManager:
         logger.info(f"Deleting session: {user_id}")
 
         if user_id in self.sessions:
-            del self.sessions[user_id]
+            self.teardown_queue.enqueue(self.sessions.pop(user_id)['session'])
 
     def is_session_active(self, user_id: str):
         """
         Check if a session is active for a user.
         """
-        logger.info(f"Checking if session is active for user {user_id}")
+        logger.debug(f"Checking if session is active for user {user_id}")
         if user_id in self.sessions:
             return time.time() - self.sessions[user_id]['timestamp'] < self.timeout
         return False
@@ -57,25 +69,62 @@ class SessionManager:
 
     def update_sessions(self):
         """
-        Update the session timestamps and delete expired sessions.
+        Delete expired sessions.
+        Only the expired sessions at the front of the expiry order are visited.
         """
-        logger.info("Updating sessions")
         outdated_sessions = []
-        for session_id in list(self.sessions.keys()):
-            if not self.is_session_active(session_id):
-                outdated_sessions.append(session_id)
-                self.delete_session(session_id)
-
-        logger.info(f"Deleted sessions: {outdated_sessions}")
+        now = time.time()
+        while self.sessions:
+            user_id, session_obj = next(iter(self.sessions.items()))
+            if now - session_obj['timestamp'] < self.timeout:
+                break
+            outdated_sessions.append(user_id)
+            self.delete_session(user_id)
+
+        if outdated_sessions:
+            logger.info(f"Deleted sessions: {outdated_sessions}")
         return outdated_sessions
 
     def refresh_session(self, user_id: str):
         """
         Reset the session timestamp.
         """
-        logger.info(f"Resetting session: {user_id}")
+        logger.debug(f"Resetting session: {user_id}")
         if user_id in self.sessions:
             self.sessions[user_id]['timestamp'] = time.time()
+            self.sessions.move_to_end(user_id)
         else:
             logger.info(f"Session not found: {user_id}")
 
+    async def start(self):
+        """
+        Start the background tasks deleting expired sessions and tearing them down.
+        """
+        await self.teardown_queue.start()
+        if self.task is None:
+            self.task = asyncio.create_task(self._sweep())
+
+    async def stop(self):
+        """
+        Stop the sweeper and tear down all sessions, the process keeps none of them.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        for user_id in list(self.sessions):
+            self.delete_session(user_id)
+        await self.teardown_queue.stop()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.update_sessions()
+            except Exception as e:
+                logger.error(f"Error sweeping sessions: {e}")
+
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A thread safe LRU cache whose entries expire after a time to live.
+    Values read from the source before a delete or clear of their key can be dropped by passing
+    the generation taken before the read to set.
+    """
+    MISSING = object()
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        """
+        :param max_size: The number of entries kept, the least recently used entry is evicted first.
+        :param ttl: The default time to live in seconds, None keeps entries until they are evicted.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Incremented by every delete and clear
+        self.counter = 0
+        # key -> the counter of its last delete, the oldest are forgotten beyond max_size
+        self.invalidations = OrderedDict()
+        # The latest counter of the invalidations forgotten or cleared
+        self.floor = 0
+
+    def get(self, key, default=MISSING):
+        """
+        Return the cached value, or default (TTLCache.MISSING) when the key is absent or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                return default
+
+            self.entries.move_to_end(key)
+            return value
+
+    def generation(self, key) -> int:
+        """
+        Take before reading the value of a key from the source, see set.
+        """
+        with self.lock:
+            return self.counter
+
+    def set(self, key, value, ttl: float = None, generation: int = None):
+        """
+        Cache a value, ttl overrides the default time to live of the cache.
+
+        :param generation: The generation of the key taken before the value was read,
+        the value is dropped when the key was deleted or the cache cleared since.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self.lock:
+            if generation is not None and self.invalidations.get(key, self.floor) > generation:
+                return
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.counter += 1
+            self.invalidations[key] = self.counter
+            self.invalidations.move_to_end(key)
+            while len(self.invalidations) > self.max_size:
+                self.floor = max(self.floor, self.invalidations.popitem(last=False)[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.counter += 1
+            self.invalidations.clear()
+            self.floor = self.counter
+
+    def __len__(self):
+        return len(self.entries)
+
+
+__all__ = ['TTLCache']
@@ -0,0 +1 @@
+from .TTLCache import TTLCache
@@ -0,0 +1,52 @@
+import asyncio
+from collections import deque
+
+from ..Session import Session
+from ..BackgroundBatcher import BackgroundBatcher
+from ..MemoryClient import call_memory
+
+
+class TeardownQueue(BackgroundBatcher):
+    """
+    Deletes the short-term memory of ended sessions in the background.
+    Sessions are torn down in concurrent batches, failed teardowns are retried on the next batch.
+    The pooled clients of a session are released once its teardown is done or given up.
+    """
+    def __init__(self, batch_size: int = 20, flush_interval: float = 5.0, max_attempts: int = 3):
+        """
+        :param batch_size: The number of sessions torn down at the same time.
+        :param flush_interval: The longest a session waits before its teardown starts.
+        :param max_attempts: The number of teardown attempts of a session before it is given up.
+        """
+        super().__init__(batch_size, flush_interval, max_attempts)
+        self.pending = deque()
+
+    def enqueue(self, session: Session):
+        session.ended = True
+        self.pending.append((session, 0))
+        self.notify()
+
+    def queued(self) -> int:
+        return len(self.pending)
+
+    async def flush(self):
+        """
+        Tear down one batch of sessions.
+        """
+        batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.batch_size))]
+        if not batch:
+            return
+
+        results = await asyncio.gather(*[self._teardown(session) for session, _ in batch], return_exceptions=True)
+
+        for (session, attempts), result in zip(batch, results):
+            if isinstance(result, Exception) and self.should_retry(attempts + 1, f"teardown of session {session.session_id}", result):
+                self.pending.append((session, attempts + 1))
+            else:
+                session.release_clients()
+
+    async def _teardown(self, session: Session):
+        await call_memory(session.memory_client.delete_all, run_id=session.session_id)
+
+
+__all__ = ['TeardownQueue']
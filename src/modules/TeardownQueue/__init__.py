@@ -0,0 +1 @@
+from .TeardownQueue import TeardownQueue
@@ -1,17 +1,103 @@
 
+import asyncio
+import inspect
+import logging
+
 from .Tool import Tool
 
 from ..Session import Session
+from ..MemoryClient import call_memory
+from ..SemanticCache import SemanticCache
+from ..MemoryWriteBehind import MemoryWriteBehind
+
+logger = logging.getLogger(__name__)
 
 class RetrieveMemory(Tool):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, embedding_model: str = "text-embedding-3-small", write_behind: MemoryWriteBehind = None, **kwargs):
+        """
+        :param embedding_model: The model embedding the queries, so near-duplicate queries are answered
+        from the session cache. None only answers repeated queries from the cache.
+        :param write_behind: The buffer of saved memories not written yet, they are added to every result.
+        """
         super().__init__(*args, **kwargs)
+        self.embedding_model = embedding_model
+        self.write_behind = write_behind
+        # Totals over all sessions
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
         
 
     async def execute(self, query: str, session: Session, **kwargs) -> str:
-        memory = session.memory_client.search(query, user_id=session.user_id)
+        memory = await self._retrieve(query, session)
+
+        # Memories saved in this session may not be written yet
+        pending = self.write_behind.pending(session.user_id) if self.write_behind is not None else []
+        if pending:
+            return {"memories": memory, "recently_saved": pending}
         return memory
 
+    async def _retrieve(self, query: str, session: Session):
+        cache = session.memory_cache
+
+        memory = cache.get(query)
+        if memory is not SemanticCache.MISSING:
+            self._count("hit", cache)
+            return memory
+
+        generation = cache.generation
+        if len(cache):
+            embedding = await self._embed(query, session)
+            memory = cache.get_similar(embedding)
+            if memory is not SemanticCache.MISSING:
+                self._count("similar_hit", cache)
+                return memory
+            memory = await self._search(query, session)
+        else:
+            # Nothing to match, the embedding is only needed for the new entry
+            embedding, memory = await asyncio.gather(self._embed(query, session), self._search(query, session))
+            cache.misses += 1
+
+        # Dropped when a memory was saved during the search
+        cache.set(query, embedding, memory, generation=generation)
+        self._count("miss", cache)
+        return memory
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.similar_hits + self.misses
+        return (self.hits + self.similar_hits) / lookups if lookups else 0.0
+
+    async def _search(self, query: str, session: Session):
+        return await call_memory(session.memory_client.search, query, user_id=session.user_id)
+
+    async def _embed(self, query: str, session: Session):
+        """
+        Embed the query with the session client, None when embeddings are disabled or fail.
+        """
+        if self.embedding_model is None:
+            return None
+
+        try:
+            client = session.async_openai_client or session.openai_client
+            response = client.embeddings.create(model=self.embedding_model, input=query)
+            if inspect.isawaitable(response):
+                response = await response
+            return response.data[0].embedding
+        except Exception as e:
+            logger.warning(f"Error embedding memory query: {e}")
+            return None
+
+    def _count(self, outcome: str, cache: SemanticCache):
+        if outcome == "hit":
+            self.hits += 1
+        elif outcome == "similar_hit":
+            self.similar_hits += 1
+        else:
+            self.misses += 1
+        logger.debug(f"Memory cache {outcome}", extra={"event": "memory.cache", "fields": {
+            "outcome": outcome, "session_hit_rate": round(cache.hit_rate, 3), "hit_rate": round(self.hit_rate, 3)}})
+
     def __str__(self) -> str:
         return "retrieve_memory"
 
@@ -2,14 +2,27 @@
 from .Tool import Tool
 
 from ..Session import Session
+from ..MemoryClient import call_memory
+from ..MemoryWriteBehind import MemoryWriteBehind
 
 class SaveMemory(Tool):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, write_behind: MemoryWriteBehind = None, **kwargs):
+        """
+        :param write_behind: Buffers the memories and writes them in the background, None writes them before answering.
+        """
         super().__init__(*args, **kwargs)
+        self.write_behind = write_behind
         
 
     async def execute(self, query: str, session: Session, **kwargs) -> str:
-        session.memory_client.add(query, user_id=session.user_id)
+        if self.write_behind is not None:
+            # The run only needs the acknowledgement, retrieve_memory reads the buffered memory meanwhile
+            self.write_behind.save(session, query)
+            return "Memory saved successfully."
+
+        await call_memory(session.memory_client.add, query, user_id=session.user_id)
+        # Cached retrievals of the user may miss the new memory
+        session.memory_cache.clear()
         return "Memory saved successfully."
 
     def __str__(self) -> str:
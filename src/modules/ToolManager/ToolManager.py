@@ -1,15 +1,36 @@
+import asyncio
+
+
 class ToolManager:
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 8, default_timeout: float = 30.0):
+        """
+        :param max_concurrency: The maximum number of tool executions running at the same time.
+        :param default_timeout: The timeout in seconds of tools registered without one.
+        """
         self.tools = {}
+        self.timeouts = {}
+        self.default_timeout = default_timeout
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
 
-    def register_tool(self, tool):
-        """Register a tool with a given name."""
+    def register_tool(self, tool, timeout: float = None):
+        """Register a tool with a given name and an optional timeout in seconds."""
         self.tools[str(tool)] = tool
+        self.timeouts[str(tool)] = timeout if timeout is not None else self.default_timeout
 
     async def use_tool(self, tool_name: str, *args, **kwargs):
-        """Execute a tool by name with the provided arguments."""
+        """
+        Execute a tool by name with the provided arguments.
+        Raises asyncio.TimeoutError when the tool runs longer than its timeout.
+        """
         if tool_name in self.tools:
-            return await self.tools[tool_name].execute(*args, **kwargs)
+            # Created on first use so it binds to the running event loop
+            if self.semaphore is None:
+                self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async with self.semaphore:
+                return await asyncio.wait_for(self.tools[tool_name].execute(*args, **kwargs),
+                                              timeout=self.timeouts[tool_name])
         else:
             raise ValueError(f"Tool '{tool_name}' not found.")
 
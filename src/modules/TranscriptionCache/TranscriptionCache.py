@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+from ..TTLCache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionCache:
+    """
+    Content addressed cache of transcriptions, keyed by a hash of the audio bytes and the model.
+    A bounded in-memory tier sits in front of an on-disk tier evicted by least recent use.
+    """
+    def __init__(self, directory: str = "cache/transcriptions", memory_size: int = 512,
+                 disk_size: int = 100 * 1024 * 1024):
+        """
+        :param directory: The directory of the on-disk tier.
+        :param memory_size: The number of transcriptions kept in memory.
+        :param disk_size: The size in bytes of the on-disk tier, the least recently used files are removed beyond it.
+        """
+        self.directory = directory
+        self.disk_size = disk_size
+        self.memory = TTLCache(max_size=memory_size, ttl=None)
+        self.disk_usage = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _hash(audio_file, model: str) -> str:
+        digest = hashlib.sha256(model.encode() + b"\0")
+        position = audio_file.tell()
+        for chunk in iter(lambda: audio_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+        audio_file.seek(position)
+        return digest.hexdigest()
+
+    async def key(self, audio_file, model: str) -> str:
+        """
+        Hash the audio from its current position, the position is restored afterwards.
+        """
+        return await asyncio.to_thread(self._hash, audio_file, model)
+
+    async def get(self, key: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is not TTLCache.MISSING:
+            return text
+
+        text = await asyncio.to_thread(self._read, key)
+        if text is not None:
+            self.memory.set(key, text)
+        return text
+
+    async def set(self, key: str, text: str):
+        self.memory.set(key, text)
+        try:
+            await asyncio.to_thread(self._write, key, text)
+        except OSError as e:
+            logger.error(f"Error writing transcription to the disk cache: {e}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def _read(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            # The modification time orders the files for eviction
+            os.utime(path)
+            return text
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.error(f"Error reading transcription from the disk cache: {e}")
+            return None
+
+    def _write(self, key: str, text: str):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        data = text.encode("utf-8")
+
+        # Write aside and rename, readers never see a partial file
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            if self.disk_usage is None:
+                self.disk_usage = self._scan_usage()
+            else:
+                self.disk_usage += len(data)
+            if self.disk_usage > self.disk_size:
+                self._evict()
+
+    def _scan_usage(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.is_file() and entry.name.endswith(".txt"))
+
+    def _evict(self):
+        """
+        Remove the least recently used files until the tier is back under 90% of its size.
+        """
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.directory)
+                         if entry.is_file() and entry.name.endswith(".txt"))
+        usage = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if usage <= self.disk_size * 0.9:
+                break
+            try:
+                os.remove(path)
+                usage -= size
+            except FileNotFoundError:
+                usage -= size
+        self.disk_usage = usage
+
+
+__all__ = ['TranscriptionCache']
@@ -0,0 +1 @@
+from .TranscriptionCache import TranscriptionCache
@@ -1,27 +1,34 @@
 from fastapi import FastAPI, Form, HTTPException, Request, status
+import asyncio
 import logging
 import os
+from typing import List, Tuple
 
 
 from ..SessionFactory import SessionFactory
 from ..SessionManager import SessionManager
 from ..WhatsAppHandler import WhatsAppHandler
-from ..DBClient import DBClient
+from ..DBClient import AsyncDBClient
 from ..OpenAIHandler import OpenAIHandler
 from ..AudioTranscriber import AudioTranscriber
+from ..MessageQueue import MessageQueue, QueueFullError
+from ..DeliveryScheduler import DeliveryScheduler, INTERACTIVE
+from ..MemoryWriter import MemoryWriter
+from ..ConversationSummarizer import ConversationSummarizer
 
 from ..Command.CommandHandler import CommandHandler
 
 class WhatsAppBot:
     def __init__(self,
-                  db_client: DBClient, 
+                  db_client: AsyncDBClient, 
                   whatsapp_handler: WhatsAppHandler, 
                   openai_handler: OpenAIHandler, 
                   audio_transcriber: AudioTranscriber, 
                   session_manager: SessionManager, 
                   session_factory: SessionFactory,
                   command_handler: CommandHandler,
-                  logger):
+                  logger,
+                  memory_writer: MemoryWriter):
         self.db_client = db_client
         self.whatsapp_handler = whatsapp_handler
         self.openai_handler = openai_handler
@@ -30,8 +37,67 @@ class WhatsAppBot:
         self.session_factory = session_factory
         self.command_handler = command_handler
         self.logger = logger
-
-
+        # Persists the turns leaving the session conversation buffers, registered as a service by the caller
+        self.memory_writer = memory_writer
+        self.services = []
+        self.message_queue = None
+        self.delivery_scheduler = None
+        self.summarizer = None
+
+    def register_service(self, service):
+        """
+        Register a background service (an object with async start and stop methods)
+        that runs for the lifetime of the bot.
+        """
+        self.services.append(service)
+
+    def enable_message_queue(self, workers: int = 8, max_depth: int = 1000, debounce_period: float = 0.0,
+                             max_debounce_delay: float = 5.0):
+        """
+        Acknowledge webhooks as soon as the sender is known and process the messages
+        on a pool of background workers, in order per sender.
+        Messages a sender sends within debounce_period of each other, or while the previous
+        reply is generated, are answered together in one assistant turn.
+        """
+        self.message_queue = MessageQueue(self.process_messages, workers=workers, max_depth=max_depth,
+                                          debounce_period=debounce_period, max_debounce_delay=max_debounce_delay)
+        self.register_service(self.message_queue)
+
+    def enable_delivery_scheduler(self, **kwargs):
+        """
+        Send replies through a DeliveryScheduler, smoothing them to the Twilio throughput limits.
+        The keyword arguments configure the scheduler.
+        """
+        self.delivery_scheduler = DeliveryScheduler(self.whatsapp_handler, **kwargs)
+        self.register_service(self.delivery_scheduler)
+
+    def enable_summarizer(self, **kwargs):
+        """
+        Fold the turns leaving the conversation buffers into a running summary, assistant runs
+        then only see the summary and the recent turns.
+        The keyword arguments configure the ConversationSummarizer.
+        """
+        self.summarizer = ConversationSummarizer(**kwargs)
+        self.register_service(self.summarizer)
+
+    async def send_message(self, From: str, To: str, text: str):
+        """
+        Reply to the user, through the delivery scheduler when it is enabled.
+        """
+        if self.delivery_scheduler is not None:
+            # Delivery failures end up in the dead-letter store, the reply is not awaited
+            self.delivery_scheduler.send(From, To, text, priority=INTERACTIVE)
+        else:
+            await self.whatsapp_handler.send_message(From, To, text)
+
+    async def start(self):
+        for service in self.services:
+            await service.start()
+
+    async def stop(self):
+        # Stop in reverse order, later services may depend on earlier ones
+        for service in reversed(self.services):
+            await service.stop()
 
     # For cloud
     async def heartbeat(self):
@@ -43,78 +109,136 @@ class WhatsAppBot:
         try:
             From, To, Body, form_data = await self.whatsapp_handler.process_request(request)
 
-            self.logger.info(f"From: {From}, To: {To}, Body: {Body}, form_data: {form_data}")
+            self.logger.info(f"Message from {From}", extra={"event": "message.received", "fields": {
+                "to": To, "body_length": len(Body or ""), "num_media": form_data.get('NumMedia')}})
+
+            if self.message_queue is None:
+                await self.process_messages([(From, To, Body, form_data)])
+                return {"success": True}
 
             # Is the user is not registered, we should not respond
-            if not self.db_client.check_user_exists(From):
+            if await self.db_client.get_user(From) is None:
                 return {"success": True}
 
-            
-            user = self.db_client.get_user(From) # Get user by phone number
+            self.message_queue.submit(From, From, To, Body, form_data)
+            return {"success": True}
 
-            # Format the phone number
-            user.phone_number = user.phone_number.replace("whatsapp:+", "")
+        except QueueFullError as e:
+            # Twilio retries the webhook later
+            self.logger.warning(f"Rejecting message from {From}: {e}")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-            logging.info(f"User: {user}")
+    async def process_messages(self, messages: List[Tuple]):
+        """
+        Answer a burst of messages from one sender in a single assistant turn.
+        Commands are executed in order, the messages before a command are answered first.
 
-            self.session_manager.update_sessions()
-            
+        :param messages: The (From, To, Body, form_data) tuples of the burst, oldest first.
+        """
+        From, To = messages[-1][0], messages[-1][1]
+        try:
+            user = await self.db_client.get_user(From) # Get user by phone number
 
-            if not self.session_manager.is_session_active(user.phone_number):
-                session = self.session_factory.create_standard_session(user)
-                self.session_manager.create_session(session)
-            else:
-                session = self.session_manager.get_session(user.phone_number)
-                
+            # Is the user is not registered, we should not respond
+            if user is None:
+                return
 
+            # Format the phone number
+            user.phone_number = user.phone_number.replace("whatsapp:+", "")
 
-            NumMedia = form_data.get('NumMedia')
-            for i in range(int(NumMedia)):
-                media_url = form_data.get(f'MediaUrl{i}')
-                media_content_type = form_data.get(f'MediaContentType{i}')
-                
-                if media_content_type.startswith('audio/ogg'):
-                    self.audio_transcriber.download_audio_file(media_url, 'temp/audio.ogg')
-                    transcribed_text = self.audio_transcriber.transcribe_audio(session, 'temp/audio.ogg')
+            # The user repr holds the API keys, keep it out of the regular logs
+            self.logger.debug(f"User: {user}", extra={"event": "message.user"})
+
+            session = None
+            bodies = []
+            for _, _, Body, form_data in messages:
+                if session is None:
+                    session = self._get_session(user)
+
+                Body = Body or ""
+                NumMedia = form_data.get('NumMedia')
+                transcriptions = []
+                for i in range(int(NumMedia)):
+                    media_url = form_data.get(f'MediaUrl{i}')
+                    media_content_type = form_data.get(f'MediaContentType{i}')
+                    
+                    if media_content_type.startswith('audio/ogg'):
+                        transcriptions.append(self.audio_transcriber.transcribe_media(session, media_url, media_content_type))
+
+                # All voice notes of the message are downloaded and transcribed at the same time
+                for transcribed_text in await asyncio.gather(*transcriptions):
                     Body += f"\n\nTranscribed Text: {transcribed_text} \n\n"
 
+                # Empty message, we shoudl check for media
+                if Body == "":
+                    continue
 
-            self.session_manager.refresh_session(user.phone_number)
-
-            
-
-            self.logger.info(f"Session: {session}")
-
-            # Empty message, we shoudl check for media
-            if Body is None or Body == "":
-                return {"success": True}
-            
-
-            command = self.command_handler.extract_command(Body)
-            if command:
-                self.command_handler.execute_command(command, self, user)
-                return {"success": True}
+                command = self.command_handler.extract_command(Body)
+                if command:
+                    if bodies:
+                        await self._run_turn(From, To, user, session, bodies)
+                        bodies = []
+                    self.command_handler.execute_command(command, self, user)
+                    # The command may have replaced the session
+                    session = None
+                    continue
 
-            
-            conv = session.memory_client.get_all(run_id=session.session_id, user_id=user.phone_number)
+                bodies.append(Body)
 
-            prompt = f"{conv}\nUser: {Body}\nAssistant:"
-
-
-            res = await self.openai_handler.query(prompt, session)
-
-            session.memory_client.add(prompt+res[0], run_id=session.session_id, user_id=user.phone_number, metadata=['Short Term'])
+            if session is None:
+                return
 
+            self.session_manager.refresh_session(user.phone_number)
 
-            self.whatsapp_handler.send_message(From, To, res[0])
+            self.logger.debug(f"Session: {session.session_id}", extra={"event": "message.session"})
 
-            return {"success": True}
+            if bodies:
+                await self._run_turn(From, To, user, session, bodies)
 
         except Exception as e:
             self.logger.error(f"Error handling message: {e}")
             if From:
-                self.whatsapp_handler.send_message(From, To, str(e))
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+                await self.send_message(From, To, str(e))
+            raise
+
+    def _get_session(self, user):
+        # Expired sessions are replaced here, the sweeper deletes the others in the background
+        if not self.session_manager.is_session_active(user.phone_number):
+            session = self.session_factory.create_standard_session(user)
+            self.session_manager.create_session(session)
+        else:
+            session = self.session_manager.get_session(user.phone_number)
+        return session
+
+    async def _run_turn(self, From: str, To: str, user, session, bodies: List[str]):
+        """
+        Answer the given message bodies with one assistant run.
+        """
+        Body = "\n\n".join(bodies)
+        run_options = self.summarizer.run_options(session) if self.summarizer is not None else None
+
+        # The session thread already holds the conversation, only the new message is sent
+        if self.openai_handler.stream:
+            # Each finished paragraph is delivered while the rest is generated
+            res = await self.openai_handler.query_stream(Body, session,
+                                                         lambda segment: self.send_message(From, To, segment),
+                                                         run_options=run_options)
+        else:
+            res = await self.openai_handler.query(Body, session, run_options=run_options)
+
+        # Recent turns stay in process, only the evicted ones are written to the short-term memory
+        # The turn accounts for every thread message added since the last turn, the run's and those of failed runs
+        messages, session.thread_messages = session.thread_messages, 0
+        evicted = session.conversation.append(Body, res[0], messages=messages)
+        if evicted:
+            self.memory_writer.enqueue(session, evicted)
+            if self.summarizer is not None:
+                self.summarizer.add(session, evicted)
+
+        if not self.openai_handler.stream:
+            await self.send_message(From, To, res[0])
 
     
 
@@ -1,11 +1,34 @@
 from fastapi import FastAPI, Form, HTTPException, Request, status
+import asyncio
 import logging
+import random
+import httpx
+
+logger = logging.getLogger(__name__)
 
 
 
 class WhatsAppHandler:
-    def __init__(self, twilio_client):
+    def __init__(self, twilio_client, chunk_size: int = 1500, max_attempts: int = 4, retry_base_delay: float = 0.5,
+                 retry_max_delay: float = 8.0, max_connections: int = 50,
+                 api_url: str = "https://api.twilio.com/2010-04-01"):
+        """
+        :param twilio_client: The Twilio client whose credentials are used to send messages.
+        :param chunk_size: The longest text sent in one message.
+        :param max_attempts: The number of attempts of a message rejected with 429 or 5xx, or failed by a network error.
+        :param retry_base_delay: The upper bound in seconds of the first retry delay, doubled on every attempt.
+        :param retry_max_delay: The upper bound in seconds of any retry delay.
+        :param max_connections: The connection limit towards the Twilio API.
+        :param api_url: The Twilio REST API base URL.
+        """
         self.client = twilio_client
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.api_url = api_url
+        self.http_client = None
 
     async def process_request(self, request: Request):
         try:
@@ -13,10 +36,8 @@ class WhatsAppHandler:
             form_data = await request.form()
             message_data = form_data.multi_items()
 
-            # Log all information from the request
-            print("Received Message Data:")
-            for key, value in message_data:
-                print(f"{key}: {value}")
+            # Log all information from the request, sampled by the log pipeline
+            logger.debug("Received Message Data", extra={"event": "webhook.form", "fields": dict(message_data)})
 
             Body = form_data.get('Body')
             From = form_data.get('From')
@@ -24,25 +45,79 @@ class WhatsAppHandler:
 
             return From, To, Body, form_data
         except Exception as e:
-            logging.getLogger().error(f"Error processing WhatsApp request: {e}")
+            logger.error(f"Error processing WhatsApp request: {e}")
             return None, None, None
 
-    def send_message(self, to, from_, body):
+    async def send_message(self, to, from_, body):
+        """
+        Send a reply, split in chunks sent one after another so they arrive in order.
+        Replies to different users are sent concurrently over the pooled connections.
+        """
         try:
-            texts = [body[i:i+1500] for i in range(0, len(body), 1500)]
+            texts = self.split_message(body)
             messages_ids = []
 
             for text in texts:
-                message = self.client.messages.create(
+                message_sid = await self.send_chunk(
                     body=text,
                     from_=from_,  # Twilio's sandbox number for WhatsApp
                     to=to
                 )
-                messages_ids.append(message.sid)
+                messages_ids.append(message_sid)
             return messages_ids
         except Exception as e:
-            logging.getLogger().error(f"Error sending WhatsApp message: {e}")
+            logger.error(f"Error sending WhatsApp message: {e}")
             return None
 
+    def split_message(self, body: str):
+        """
+        Split a reply into the chunks sent as separate messages.
+        """
+        return [body[i:i+self.chunk_size] for i in range(0, len(body), self.chunk_size)]
+
+    async def send_chunk(self, body: str, from_: str, to: str) -> str:
+        """
+        Create a message with the Twilio Messages API, retrying 429 and 5xx responses
+        and network errors after a jittered exponential backoff.
+
+        :return: The message SID.
+        """
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(limits=self.limits, timeout=30.0)
+
+        # Read the client once, it may be swapped while the message is sent
+        client = self.client
+        url = f"{self.api_url}/Accounts/{client.account_sid}/Messages.json"
+
+        for attempt in range(self.max_attempts):
+            last_attempt = attempt == self.max_attempts - 1
+            delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+            try:
+                response = await self.http_client.post(url, data={"Body": body, "From": from_, "To": to},
+                                                       auth=(client.username, client.password))
+            except httpx.TransportError as e:
+                # Connection failures and timeouts
+                if last_attempt:
+                    raise
+                logger.warning(f"Error sending to Twilio ({type(e).__name__}: {e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or last_attempt:
+                response.raise_for_status()
+                return response.json()["sid"]
+
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            logger.warning(f"Twilio answered {response.status_code}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
 
+    async def start(self):
+        pass
 
+    async def stop(self):
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The modules are imported as src.modules.<Name>, like main does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """
+    A settable stand-in for time.monotonic.
+    """
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("time.monotonic", clock)
+    return clock
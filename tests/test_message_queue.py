@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from src.modules.MessageQueue import MessageQueue, QueueFullError
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_messages_of_a_key_are_handled_in_order():
+    batches = []
+
+    async def handler(batch):
+        await asyncio.sleep(0.01)
+        batches.append([args for args in batch])
+
+    async def main():
+        queue = MessageQueue(handler, workers=4, max_batch=1)
+        await queue.start()
+        for i in range(5):
+            queue.submit("alice", "alice", i)
+        await queue.stop()
+
+    run(main())
+    assert [batch[0][1] for batch in batches] == [0, 1, 2, 3, 4]
+
+
+def test_keys_are_handled_concurrently():
+    running = set()
+    overlapped = []
+
+    async def handler(batch):
+        key = batch[0][0]
+        running.add(key)
+        await asyncio.sleep(0.02)
+        overlapped.append(len(running) > 1)
+        running.discard(key)
+
+    async def main():
+        queue = MessageQueue(handler, workers=2)
+        await queue.start()
+        queue.submit("alice", "alice")
+        queue.submit("bob", "bob")
+        await queue.stop()
+
+    run(main())
+    assert any(overlapped)
+
+
+def test_messages_queued_while_a_batch_runs_form_the_next_batch():
+    batches = []
+
+    async def handler(batch):
+        batches.append([args[1] for args in batch])
+        await asyncio.sleep(0.02)
+
+    async def main():
+        queue = MessageQueue(handler, workers=2)
+        await queue.start()
+        queue.submit("alice", "alice", 0)
+        await asyncio.sleep(0.005)
+        queue.submit("alice", "alice", 1)
+        queue.submit("alice", "alice", 2)
+        await queue.stop()
+
+    run(main())
+    assert batches == [[0], [1, 2]]
+
+
+def test_debounce_batches_a_burst():
+    batches = []
+
+    async def handler(batch):
+        batches.append([args[1] for args in batch])
+
+    async def main():
+        queue = MessageQueue(handler, workers=2, debounce_period=0.05)
+        await queue.start()
+        for i in range(3):
+            queue.submit("alice", "alice", i)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        queue.submit("alice", "alice", 3)
+        await asyncio.sleep(0.1)
+        await queue.stop()
+
+    run(main())
+    assert batches == [[0, 1, 2], [3]]
+
+
+def test_debounce_is_bounded_by_max_debounce_delay():
+    batches = []
+
+    async def handler(batch):
+        batches.append([args[1] for args in batch])
+
+    async def main():
+        queue = MessageQueue(handler, workers=1, debounce_period=0.05, max_debounce_delay=0.08)
+        await queue.start()
+        # Every message restarts the debounce period, the first batch is still released after max_debounce_delay
+        for i in range(6):
+            queue.submit("alice", "alice", i)
+            await asyncio.sleep(0.03)
+        await queue.stop()
+
+    run(main())
+    assert len(batches) > 1
+    assert [i for batch in batches for i in batch] == list(range(6))
+
+
+def test_submit_raises_when_full():
+    async def handler(batch):
+        await asyncio.sleep(1)
+
+    async def main():
+        queue = MessageQueue(handler, workers=1, max_depth=2, drain_timeout=0.01)
+        await queue.start()
+        queue.submit("alice", "alice")
+        queue.submit("bob", "bob")
+        with pytest.raises(QueueFullError):
+            queue.submit("carol", "carol")
+        await queue.stop()
+
+    run(main())
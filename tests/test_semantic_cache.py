@@ -0,0 +1,38 @@
+from src.modules.SemanticCache import SemanticCache
+
+
+def test_semantic_cache_matches_normalized_queries():
+    cache = SemanticCache()
+    cache.set("Where do I live?", None, ["Oslo"])
+    assert cache.get("  where do i   LIVE? ") == ["Oslo"]
+    assert cache.hits == 1
+
+
+def test_semantic_cache_matches_similar_embeddings():
+    cache = SemanticCache(similarity_threshold=0.9)
+    cache.set("favourite coffee", [1.0, 0.1], ["espresso"])
+    cache.set("weather", [0.0, 1.0], ["rain"])
+
+    assert cache.get_similar([0.99, 0.12]) == ["espresso"]
+    assert cache.get_similar([0.7, 0.7]) is SemanticCache.MISSING
+    assert cache.get_similar(None) is SemanticCache.MISSING
+    assert (cache.similar_hits, cache.misses) == (1, 2)
+
+
+def test_semantic_cache_evicts_and_expires(clock):
+    cache = SemanticCache(max_size=2, ttl=30)
+    cache.set("a", None, 1)
+    cache.set("b", None, 2)
+    cache.set("c", None, 3)
+    assert cache.get("a") is SemanticCache.MISSING
+
+    clock.now += 31
+    assert cache.get("c") is SemanticCache.MISSING
+
+
+def test_semantic_cache_drops_results_read_before_a_clear():
+    cache = SemanticCache()
+    generation = cache.generation
+    cache.clear()
+    cache.set("a", None, 1, generation=generation)
+    assert cache.get("a") is SemanticCache.MISSING
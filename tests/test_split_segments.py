@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("mem0")
+
+from src.modules.OpenAIHandler import OpenAIHandler
+
+
+@pytest.fixture
+def handler():
+    return OpenAIHandler(tool_manager=None, min_segment_length=20, max_segment_length=60)
+
+
+def test_short_text_stays_buffered(handler):
+    assert handler._split_segments("Hello") == ([], "Hello")
+
+
+def test_text_is_cut_at_paragraphs_once_long_enough(handler):
+    buffer = "First paragraph is long enough.\n\nSecond one"
+    assert handler._split_segments(buffer) == (["First paragraph is long enough."], "Second one")
+
+
+def test_short_paragraphs_are_not_cut(handler):
+    assert handler._split_segments("Hi.\n\nThere") == ([], "Hi.\n\nThere")
+
+
+def test_long_text_is_cut_at_the_last_sentence_end(handler):
+    buffer = "One sentence here. Another sentence that keeps going and going on"
+    segments, rest = handler._split_segments(buffer)
+    assert segments == ["One sentence here."]
+    assert rest == "Another sentence that keeps going and going on"
+
+
+def test_final_hands_out_everything(handler):
+    assert handler._split_segments("  tail text ", final=True) == (["tail text"], "")
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from src.modules.DeliveryScheduler import TokenBucket
+
+
+def test_a_full_bucket_allows_a_burst(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert bucket.delay(3) == 0
+    bucket.take(3)
+    assert bucket.delay(1) == pytest.approx(1.0)
+
+
+def test_tokens_refill_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=4)
+    bucket.take(4)
+    clock.now += 1
+    assert bucket.delay(2) == 0
+    assert bucket.delay(3) == pytest.approx(0.5)
+
+
+def test_refill_is_capped_at_the_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    clock.now += 100
+    bucket.take(2)
+    assert bucket.delay(1) == pytest.approx(0.1)
+
+
+def test_requests_larger_than_the_bucket_wait_for_a_full_bucket(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.take(1)
+    assert bucket.delay(5) == pytest.approx(1.0)
+    clock.now += 1
+    bucket.take(5)
+    assert bucket.tokens == pytest.approx(0)
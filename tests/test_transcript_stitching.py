@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("openai")
+pytest.importorskip("mem0")
+
+from src.modules.AudioTranscriber.AudioSplitter import stitch
+
+
+def test_segments_cut_at_silences_are_joined():
+    assert stitch(["Hello there.", "How are you?"], [False, False]) == "Hello there. How are you?"
+
+
+def test_words_repeated_by_an_overlapping_segment_are_dropped():
+    texts = ["we went to the market and", "market and bought apples"]
+    assert stitch(texts, [False, True]) == "we went to the market and bought apples"
+
+
+def test_overlap_matching_ignores_case_and_punctuation():
+    texts = ["I said hello, World", "world. Then I left"]
+    assert stitch(texts, [False, True]) == "I said hello, World Then I left"
+
+
+def test_segments_without_overlap_keep_repeated_words():
+    texts = ["it was good", "good food"]
+    assert stitch(texts, [False, False]) == "it was good good food"
+
+
+def test_first_segment_is_kept_whole():
+    assert stitch(["one two"], [True]) == "one two"
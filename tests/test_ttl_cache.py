@@ -0,0 +1,72 @@
+from src.modules.TTLCache import TTLCache
+
+
+def test_missing_key_returns_the_sentinel():
+    cache = TTLCache(max_size=2, ttl=60)
+    assert cache.get("a") is TTLCache.MISSING
+    cache.set("a", None)
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is TTLCache.MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+
+    clock.now += 10
+    assert cache.get("b") is TTLCache.MISSING
+    assert cache.get("a") == 1
+
+    clock.now += 60
+    assert cache.get("a") is TTLCache.MISSING
+
+
+def test_delete_and_clear():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    assert cache.get("a") is TTLCache.MISSING
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_values_read_before_a_delete_are_not_cached():
+    cache = TTLCache(max_size=10, ttl=60)
+    generation = cache.generation("a")
+    cache.delete("a")
+    cache.set("a", "stale", generation=generation)
+    assert cache.get("a") is TTLCache.MISSING
+
+    cache.set("b", 1, generation=generation)
+    assert cache.get("b") == 1
+
+
+def test_values_read_before_a_clear_are_not_cached():
+    cache = TTLCache(max_size=1, ttl=60)
+    generation = cache.generation("a")
+    cache.clear()
+    cache.set("a", "stale", generation=generation)
+    assert cache.get("a") is TTLCache.MISSING
+
+
+def test_forgotten_invalidations_still_drop_older_reads():
+    cache = TTLCache(max_size=1, ttl=60)
+    generation = cache.generation("a")
+    cache.delete("a")
+    cache.delete("b")
+    cache.set("a", "stale", generation=generation)
+    assert cache.get("a") is TTLCache.MISSING
@@ -40,8 +40,12 @@ app = FastAPI()
 
 @app.post("/handleMessage")
 async def handle_message(Body: str = Form(), From: str = Form(), To: str = Form()):
-    whatsapp_handler = WhatsAppHandler(twilio_client)    
-    whatsapp_handler.send_message(From, To, Body)
+    whatsapp_handler = WhatsAppHandler(twilio_client)
+    try:
+        await whatsapp_handler.send_message(From, To, Body)
+    finally:
+        # The handler opens its own HTTP client
+        await whatsapp_handler.stop()
     return {"success": True}
 
 if __name__ == "__main__":